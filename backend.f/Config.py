@@ -1,6 +1,8 @@
 from Filler import SensorFloat, WaterLevel, Button
-import threading
 import logging
+import sys
+
+from state_store import StateStore
 
 # Configure logging
 logging.basicConfig(
@@ -87,76 +89,39 @@ HGPCheckStatus = False
 backflush1 = 4 
 backflush2 = 4
 
-# Thread lock for thread-safe updates
-update_lock = threading.Lock()
+# Fields published to readers; everything else is set once at import
+STATE_FIELDS = (
+    'FLOWGPH1CGF', 'FLOWGPH2CGF', 'tempMainTankFlag', 'tempHeadGP1Flag', 'tempHeadGP2Flag',
+    'enableHeadGP1', 'enableHeadGP2', 'enableMainTank', 'Pressure1', 'Pressure2',
+    'mainTankState', 'HGP1State', 'HGP2State', 'HGP1ACTIVE', 'HGP2ACTIVE',
+)
+
+# Writers are serialized and publish a new snapshot per update; readers
+# take the current snapshot without locking
+state = StateStore(sys.modules[__name__], [
+    ('sensors', lambda: {sensor.ID: sensor.value for sensor in sensors}),
+    *STATE_FIELDS,
+])
 
 def update_sensor_value(sensor_id, value):
     """Update sensor value thread-safely"""
-    with update_lock:
+    with state.writing():
         if sensor_id in sensor_dict:
             sensor_dict[sensor_id].value = value
-            logger.debug(f"Updated sensor {sensor_id} to {value}")
+            logger.debug("Updated sensor %s to %s", sensor_id, value)
 
 def update_system_state(state_id, value):
     """Update system state thread-safely"""
-    with update_lock:
-        global FLOWGPH1CGF, FLOWGPH2CGF, tempMainTankFlag, tempHeadGP1Flag, tempHeadGP2Flag
-        global enableHeadGP1, enableHeadGP2, enableMainTank, Pressure1, Pressure2
-        global mainTankState, HGP1State, HGP2State, HGP1ACTIVE, HGP2ACTIVE
-        
-        if state_id == 'FLOWGPH1CGF':
-            FLOWGPH1CGF = value
-        elif state_id == 'FLOWGPH2CGF':
-            FLOWGPH2CGF = value
-        elif state_id == 'tempMainTankFlag':
-            tempMainTankFlag = value
-        elif state_id == 'tempHeadGP1Flag':
-            tempHeadGP1Flag = value
-        elif state_id == 'tempHeadGP2Flag':
-            tempHeadGP2Flag = value
-        elif state_id == 'enableHeadGP1':
-            enableHeadGP1 = value
-        elif state_id == 'enableHeadGP2':
-            enableHeadGP2 = value
-        elif state_id == 'enableMainTank':
-            enableMainTank = value
-        elif state_id == 'Pressure1':
-            Pressure1 = value
-        elif state_id == 'Pressure2':
-            Pressure2 = value
-        elif state_id == 'mainTankState':
-            mainTankState = value
-        elif state_id == 'HGP1State':
-            HGP1State = value
-        elif state_id == 'HGP2State':
-            HGP2State = value
-        elif state_id == 'HGP1ACTIVE':
-            HGP1ACTIVE = value
-        elif state_id == 'HGP2ACTIVE':
-            HGP2ACTIVE = value
-        
-        logger.debug(f"Updated state {state_id} to {value}")
+    if state_id not in STATE_FIELDS:
+        return
+    with state.writing():
+        globals()[state_id] = value
+        logger.debug("Updated state %s to %s", state_id, value)
 
 def get_system_state():
     """Get current system state for UART transmission"""
-    with update_lock:
-        return {
-            'sensors': {sensor.ID: sensor.value for sensor in sensors},
-            'states': {
-                'FLOWGPH1CGF': FLOWGPH1CGF,
-                'FLOWGPH2CGF': FLOWGPH2CGF,
-                'tempMainTankFlag': tempMainTankFlag,
-                'tempHeadGP1Flag': tempHeadGP1Flag,
-                'tempHeadGP2Flag': tempHeadGP2Flag,
-                'enableHeadGP1': enableHeadGP1,
-                'enableHeadGP2': enableHeadGP2,
-                'enableMainTank': enableMainTank,
-                'Pressure1': Pressure1,
-                'Pressure2': Pressure2,
-                'mainTankState': mainTankState,
-                'HGP1State': HGP1State,
-                'HGP2State': HGP2State,
-                'HGP1ACTIVE': HGP1ACTIVE,
-                'HGP2ACTIVE': HGP2ACTIVE
-            }
-        } 
\ No newline at end of file
+    snapshot = state.snapshot()
+    return {
+        'sensors': dict(snapshot.sensors),
+        'states': {name: getattr(snapshot, name) for name in STATE_FIELDS}
+    }
@@ -0,0 +1,102 @@
+"""On/off state of the actuators (UART flags 22-44) as one integer bitmask.
+
+Bit i of the mask is the actuator with flag first + i, so the whole state
+is a single int that can be copied into a snapshot, compared and sent to
+clients in one piece.  apply() sets any number of actuators at once and
+returns only the ones whose state actually changed, which are the only
+frames worth sending.
+"""
+import threading
+
+FIRST_FLAG = 22
+LAST_FLAG = 44
+
+
+class ActuatorError(ValueError):
+    """A batch of actuator changes that can't be applied; errors lists every problem."""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+class ActuatorBank:
+    """Commanded actuator states, held as a bitmask."""
+
+    def __init__(self, first=FIRST_FLAG, last=LAST_FLAG):
+        self.first = first
+        self.last = last
+        self.all_bits = (1 << (last - first + 1)) - 1
+        self._lock = threading.Lock()
+        self.mask = 0
+
+    def bit(self, flag):
+        return 1 << (flag - self.first)
+
+    def apply(self, bits, select=None):
+        """Set the actuators selected by select (default: all) to their bits in bits.
+
+        Returns [(flag, enabled)] for the actuators that changed, in flag order.
+        """
+        select = self.all_bits if select is None else select & self.all_bits
+        with self._lock:
+            old = self.mask
+            self.mask = (old & ~select) | (bits & select)
+            changed = old ^ self.mask
+        result = []
+        while changed:
+            low = changed & -changed
+            index = low.bit_length() - 1
+            result.append((self.first + index, bool(self.mask & low)))
+            changed ^= low
+        return result
+
+    def parse(self, params):
+        """(bits, select) from a request body.
+
+        Either {"actuators": {"22": true, "30": false, ...}} for individual
+        actuators, or {"mask": m} to set all of them at once, optionally
+        with {"select": s} to only touch the actuators whose bits are set
+        in s.  Raises ActuatorError listing every invalid entry.
+        """
+        errors = []
+        bits = select = 0
+        actuators = params.get('actuators')
+        if actuators is not None:
+            if not isinstance(actuators, dict):
+                raise ActuatorError(["actuators must be an object of flag: true/false"])
+            for key, enabled in actuators.items():
+                try:
+                    flag = int(key)
+                except (TypeError, ValueError):
+                    errors.append(f"{key!r} is not an actuator flag")
+                    continue
+                if not self.first <= flag <= self.last:
+                    errors.append(f"flag {flag} is not an actuator ({self.first}-{self.last})")
+                elif not isinstance(enabled, bool):
+                    errors.append(f"flag {flag}: {enabled!r} is not true or false")
+                else:
+                    select |= self.bit(flag)
+                    if enabled:
+                        bits |= self.bit(flag)
+        for name in ('mask', 'select'):
+            value = params.get(name)
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= self.all_bits:
+                errors.append(f"{name} must be an integer from 0 to {self.all_bits}")
+        if params.get('mask') is not None and actuators is not None:
+            errors.append("give either actuators or mask, not both")
+        if errors:
+            raise ActuatorError(errors)
+        if params.get('mask') is not None:
+            bits = params['mask']
+            select = params.get('select', self.all_bits)
+        elif actuators is None:
+            raise ActuatorError(["nothing to set: give actuators or mask"])
+        return bits, select
+
+    def as_dict(self, mask=None):
+        """{flag: enabled} for every actuator, from mask or the current state."""
+        mask = self.mask if mask is None else mask
+        return {flag: bool(mask >> (flag - self.first) & 1) for flag in range(self.first, self.last + 1)}
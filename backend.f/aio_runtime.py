@@ -0,0 +1,189 @@
+"""Single event loop runtime for the backend (BACKEND_RUNTIME=asyncio).
+
+AsyncHTTPServer accepts connections with asyncio and reads each request
+without blocking the loop, then runs the unchanged BaseHTTPRequestHandler
+subclass against in-memory request and response buffers.  Handlers are
+short and never wait on the network, so they run inline on the loop.
+Long-lived responses such as /stream are served by coroutines registered
+in `streams` instead.
+
+UARTWatcher calls back when the serial port becomes readable, so UART
+input, HTTP and (through Scheduler.run_async / TransmitQueue.run_async)
+timers and UART output are all driven by the same loop.
+"""
+import asyncio
+import io
+import logging
+
+logger = logging.getLogger('backend.aio')
+
+_MAX_BODY = 1 << 20
+
+
+def simple_response(code, message, close=True):
+    """A complete plain-text HTTP/1.1 response."""
+    body = message.encode()
+    return (f"HTTP/1.1 {code} {message}\r\n"
+            f"Content-Type: text/plain\r\nContent-Length: {len(body)}\r\n"
+            f"{'Connection: close' if close else ''}\r\n\r\n").encode() + body
+
+
+def stream_head(content_type):
+    """Response head for a long-lived streamed body; the connection closes when it ends."""
+    return (f"HTTP/1.1 200 OK\r\nContent-type: {content_type}\r\nCache-Control: no-cache\r\n"
+            f"Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n").encode()
+
+
+def _content_length(head):
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            return int(value.strip())
+    return 0
+
+
+class AsyncHTTPServer:
+    """Serves handler_class on the running event loop, with keep-alive.
+
+    streams maps a GET path to a coroutine function(writer) that writes the
+    whole response itself and returns when the client is done.
+    """
+
+    def __init__(self, handler_class, streams=None, keepalive_timeout=5.0):
+        self.handler_class = handler_class
+        self.streams = dict(streams or {})
+        self.keepalive_timeout = keepalive_timeout
+        self._server = None
+        self._connections = set()
+        self._idle = set()  # Connections waiting for their next request
+
+    async def start(self, host, port):
+        self._server = await asyncio.start_server(self._serve_connection, host or None, port,
+                                                  reuse_address=True)
+        return self
+
+    async def close(self, timeout=5.0):
+        """Stop accepting, then give requests in progress up to timeout seconds to finish."""
+        if self._server is not None:
+            self._server.close()
+        for task in self._idle:
+            task.cancel()
+        if self._connections:
+            _, pending = await asyncio.wait(self._connections, timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+    async def _serve_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        peer = writer.get_extra_info('peername') or ('', 0)
+        try:
+            while True:
+                self._idle.add(task)
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keepalive_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    return
+                finally:
+                    self._idle.discard(task)
+                method, _, rest = head.partition(b' ')
+                path = rest.split(b' ', 1)[0].split(b'?', 1)[0].decode('latin-1')
+                stream = self.streams.get(path) if method == b'GET' else None
+                if stream is not None:
+                    await stream(writer)
+                    return
+                try:
+                    length = _content_length(head)
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= _MAX_BODY:
+                    writer.write(simple_response(400, "Bad Request"))
+                    await writer.drain()
+                    return
+                body = await reader.readexactly(length) if length else b''
+                response, keep_alive = self._dispatch(head + body, peer)
+                writer.write(response)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Error serving connection from %s", peer[0])
+        finally:
+            self._connections.discard(task)
+            self._idle.discard(task)
+            writer.close()
+
+    def _dispatch(self, request, peer):
+        """Run the handler class on one buffered request; returns (response bytes, keep alive)."""
+        handler = self.handler_class.__new__(self.handler_class)
+        handler.request = None
+        handler.client_address = peer[:2]
+        handler.server = self
+        handler.rfile = io.BytesIO(request)
+        handler.wfile = handler._socket_wfile = io.BytesIO()
+        handler.close_connection = True
+        try:
+            handler.handle_one_request()
+        except Exception:
+            logger.exception("Handler failed for %r", request[:80])
+            return simple_response(500, "Internal Server Error"), False
+        return handler._socket_wfile.getvalue(), not handler.close_connection
+
+
+class UARTWatcher:
+    """Feeds lines from a UARTCommunicator to on_lines whenever its port is readable.
+
+    While the port is missing or failing it retries opening it every
+    retry seconds from the loop.
+    """
+
+    def __init__(self, uart, on_lines, retry=1.0):
+        self.uart = uart
+        self.on_lines = on_lines
+        self.retry = retry
+        self._loop = None
+        self._fd = None
+        self._retry_handle = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._attach()
+
+    def stop(self):
+        self._detach()
+        if self._retry_handle is not None:
+            self._retry_handle.cancel()
+            self._retry_handle = None
+
+    def _attach(self):
+        self._retry_handle = None
+        uart = self.uart
+        try:
+            uart.ensure_open()
+            self._fd = uart.serial.fileno()
+        except Exception:
+            self._fd = None
+            self._retry_handle = self._loop.call_later(self.retry, self._attach)
+            return
+        self._loop.add_reader(self._fd, self._readable)
+
+    def _detach(self):
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+
+    def _readable(self):
+        try:
+            lines = self.uart.read_lines(timeout=0)
+        except Exception as e:
+            logger.error("UART read failed: %s", e)
+            self._detach()
+            self._retry_handle = self._loop.call_later(self.retry, self._attach)
+            return
+        if lines:
+            self.on_lines(lines)
@@ -1,22 +1,18 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer
 from typing import Any
 from urllib.parse import parse_qs
 import json
 import threading
 import time
 import logging
-import sys
 
-# Configure logging to print to both file and console
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(message)s',  # Remove timestamp and level
-    handlers=[
-        logging.FileHandler('backend.log', mode='w'),  # Clear file on start
-        logging.StreamHandler(sys.stdout)  # Print to console
-    ]
-)
-logger = logging.getLogger(__name__)
+from http_server import KeepAliveRequestHandler, PooledHTTPServer, install_shutdown_signals
+from snapshots import SnapshotCache, freeze
+from log_setup import configure_logging
+
+# Log to both file and console through a background queue listener
+configure_logging('backend.log')
+logger = logging.getLogger('backend')
+http_log = logging.getLogger('backend.http')
 
 class Config:
     def __init__(self):
@@ -50,9 +46,9 @@ class Config:
         
         # Group Head 2 Configuration
         self.gh2_config = {
-                "temperature": 92.0,
+            "temperature": 92.0,
             "extraction_volume": 0,
-                "extraction_time": 20,
+            "extraction_time": 20,
             "pre_infusion": 0,
             "purge": 0,
             "backflush": False
@@ -89,6 +85,10 @@ class Config:
         self.ecomode = 0
         self.dischargeMode = 0
         
+        # Timing parameters
+        self.timeHGP1 = 0.0
+        self.timeHGP2 = 0.0
+        
         # System states
         self.mainTankState = 1
         self.HGP1State = 1
@@ -106,12 +106,83 @@ class Config:
             "temperature": 125.0,
             "pressure": 9.0
         }
-        print("Configuration initialized")
+        logger.debug("Configuration initialized")
 
 # Create global config instance
 config = Config()
 
-class RequestHandler(BaseHTTPRequestHandler):
+# Serialized responses for the busiest GET endpoints, rebuilt only on change
+snapshots = SnapshotCache()
+
+def getdata_key():
+    return (
+        tuple(config.sensors.values()),
+        config.FLOWGPH1CGF, config.FLOWGPH2CGF,
+        config.HGP1ACTIVE, config.HGP2ACTIVE,
+        config.mainTankState, config.HGP1State, config.HGP2State,
+        config.sebar, config.Pressure1, config.Pressure2,
+        config.timeHGP1, config.timeHGP2,
+    )
+
+def build_getdata():
+    data = config.sensors.copy()
+    
+    # Add additional data
+    data["HeadGP1WaterFlow"] = config.FLOWGPH2CGF
+    data["HeadGP2WaterFlow"] = config.FLOWGPH1CGF
+    data["HGP1ACTIVE"] = config.HGP1ACTIVE
+    data["HGP2ACTIVE"] = config.HGP2ACTIVE
+    data["mainTankState"] = config.mainTankState
+    data["HGP1State"] = config.HGP1State
+    data["HGP2State"] = config.HGP2State
+    
+    # Handle pressure data
+    if config.sebar == 0:
+        data["PressureGPH1"] = config.Pressure1
+        data["PressureGPH2"] = config.Pressure2
+    else:
+        data["PressureGPH1"] = "3"
+        data["PressureGPH2"] = "3"
+    
+    data["timeHGP1"] = config.timeHGP1
+    data["timeHGP2"] = config.timeHGP2
+    data["HeadGP1TopTemp"] = str(config.sensors["HeadGP1TopTemp"])
+    data["HeadGP2TopTemp"] = str(config.sensors["HeadGP2TopTemp"])
+    return data
+
+def gauge_key():
+    return (config.Pressure1, config.tempMainTankSetPoint, config.FLOWGPH1CGF,
+            config.sensors["MainTankWaterLevel"])
+
+def build_gauge():
+    return {
+        "pressure": {
+            "value": config.Pressure1,
+            "min": 0,
+            "max": 12,
+            "unit": "bar"
+        },
+        "temperature": {
+            "value": config.tempMainTankSetPoint,
+            "min": 0,
+            "max": 120,
+            "unit": "°C"
+        },
+        "flow": {
+            "value": config.FLOWGPH1CGF,
+            "min": 0,
+            "max": 5,
+            "unit": "L/min"
+        },
+        "water_level": {
+            "value": config.sensors["MainTankWaterLevel"],
+            "min": 0,
+            "max": 100,
+            "unit": "%"
+        }
+    }
+
+class RequestHandler(KeepAliveRequestHandler):
     def log_message(self, format, *args):
         # Don't log HTTP requests
         pass
@@ -153,36 +224,7 @@ class RequestHandler(BaseHTTPRequestHandler):
             self.wfile.write(json.dumps(status_data).encode())
             
         elif self.path == '/getdata':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            data = config.sensors.copy()
-            
-            # Add additional data
-            data["HeadGP1WaterFlow"] = config.FLOWGPH2CGF
-            data["HeadGP2WaterFlow"] = config.FLOWGPH1CGF
-            data["HGP1ACTIVE"] = config.HGP1ACTIVE
-            data["HGP2ACTIVE"] = config.HGP2ACTIVE
-            data["mainTankState"] = config.mainTankState
-            data["HGP1State"] = config.HGP1State
-            data["HGP2State"] = config.HGP2State
-            
-            # Handle pressure data
-            if config.sebar == 0:
-                data["PressureGPH1"] = config.Pressure1
-                data["PressureGPH2"] = config.Pressure2
-            else:
-                data["PressureGPH1"] = "3"
-                data["PressureGPH2"] = "3"
-            
-            data["timeHGP1"] = config.timeHGP1
-            data["timeHGP2"] = config.timeHGP2
-            data["HeadGP1TopTemp"] = str(config.sensors["HeadGP1TopTemp"])
-            data["HeadGP2TopTemp"] = str(config.sensors["HeadGP2TopTemp"])
-            
-            self.wfile.write(json.dumps(data).encode())
+            self.send_json_snapshot(snapshots, 'getdata', getdata_key(), build_getdata)
             
         elif self.path == '/geterror':
             self.send_response(200)
@@ -199,62 +241,16 @@ class RequestHandler(BaseHTTPRequestHandler):
             self.wfile.write(json.dumps(data).encode())
             
         elif self.path == '/getgauge':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            gauge_data = {
-                "pressure": {
-                    "value": config.Pressure1,
-                    "min": 0,
-                    "max": 12,
-                    "unit": "bar"
-                },
-                "temperature": {
-                    "value": config.tempMainTankSetPoint,
-                    "min": 0,
-                    "max": 120,
-                    "unit": "°C"
-                },
-                "flow": {
-                    "value": config.FLOWGPH1CGF,
-                    "min": 0,
-                    "max": 5,
-                    "unit": "L/min"
-                },
-                "water_level": {
-                    "value": config.sensors["MainTankWaterLevel"],
-                    "min": 0,
-                    "max": 100,
-                    "unit": "%"
-                }
-            }
-            
-            self.wfile.write(json.dumps(gauge_data).encode())
+            self.send_json_snapshot(snapshots, 'getgauge', gauge_key(), build_gauge)
 
         elif self.path == '/getghconfig':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            gh_config = {
-                "gh1": config.gh1_config,
-                "gh2": config.gh2_config
-            }
-            
-            self.wfile.write(json.dumps(gh_config).encode())
+            self.send_json_snapshot(snapshots, 'getghconfig',
+                                    (freeze(config.gh1_config), freeze(config.gh2_config)),
+                                    lambda: {"gh1": config.gh1_config, "gh2": config.gh2_config})
 
         elif self.path == '/getmainconfig':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            main_config = config.mainAmpereConfig.copy()
-            
-            self.wfile.write(json.dumps(main_config).encode())
+            self.send_json_snapshot(snapshots, 'getmainconfig', freeze(config.mainAmpereConfig),
+                                    config.mainAmpereConfig.copy)
             
         else:
             self.send_response(404)
@@ -272,14 +268,13 @@ class RequestHandler(BaseHTTPRequestHandler):
         
     def do_POST(self):
         try:
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length).decode('utf-8')
-        params = json.loads(post_data)
+            content_length = int(self.headers['Content-Length'])
+            post_data = self.rfile.read(content_length).decode('utf-8')
+            params = json.loads(post_data)
         
             if self.path == '/setmainconfig':
                 # Log the received request
-                print("\nReceived POST request to /setmainconfig")
-                print("Request data:", json.dumps(params, indent=2))
+                http_log.debug("Received POST request to /setmainconfig: %s", params)
                 
                 # Get the new configuration
                 new_config = params.get('config', {})
@@ -290,17 +285,11 @@ class RequestHandler(BaseHTTPRequestHandler):
                 })
                 
                 # Log the updated configuration
-                print("\nUpdated Main Configuration:")
-                print("--------------------------------")
-                print(json.dumps({
-                    "temperature": config.mainAmpereConfig['temperature']
-                }, indent=2))
-                print("--------------------------------\n")
+                http_log.debug("Updated main configuration: temperature=%s", config.mainAmpereConfig['temperature'])
             
             elif self.path == '/saveghconfig':
                 # Log the received request
-                print("\nReceived POST request to /saveghconfig")
-                print("Request data:", json.dumps(params, indent=2))
+                http_log.debug("Received POST request to /saveghconfig: %s", params)
                 
                 # Get the new configuration
                 new_config = params.get('config', {})
@@ -327,59 +316,35 @@ class RequestHandler(BaseHTTPRequestHandler):
                 })
 
                 # Log the updated configurations
-                print("\nUpdated Group Head Configurations:")
-                print("--------------------------------")
-                print("Group Head 1:")
-                print(json.dumps({
-                    "temperature": config.gh1_config['temperature'],
-                    "pre_infusion": {
-                        "enabled": bool(config.gh1_config['pre_infusion'] > 0),
-                        "time": config.gh1_config['pre_infusion']
-                    },
-                    "extraction_time": config.gh1_config['extraction_time'],
-                    "volume": config.gh1_config['extraction_volume'],
-                    "purge": config.gh1_config['purge'],
-                    "backflush": config.gh1_config['backflush']
-                }, indent=2))
-                print("\nGroup Head 2:")
-                print(json.dumps({
-                    "temperature": config.gh2_config['temperature'],
-                    "pre_infusion": {
-                        "enabled": bool(config.gh2_config['pre_infusion'] > 0),
-                        "time": config.gh2_config['pre_infusion']
-                    },
-                    "extraction_time": config.gh2_config['extraction_time'],
-                    "volume": config.gh2_config['extraction_volume'],
-                    "purge": config.gh2_config['purge'],
-                    "backflush": config.gh2_config['backflush']
-                }, indent=2))
-                print("--------------------------------\n")
+                http_log.debug("Updated group head configurations: GH1 %s, GH2 %s", config.gh1_config, config.gh2_config)
 
             # Send success response
-        self.send_response(200)
-        self.send_header('Content-type', 'text/html')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'POST, GET, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-        self.wfile.write(b'POST request received!')
+            self.send_response(200)
+            self.send_header('Content-type', 'text/html')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Access-Control-Allow-Methods', 'POST, GET, OPTIONS')
+            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+            self.end_headers()
+            self.wfile.write(b'POST request received!')
             
         except Exception as e:
-            print(f"Error processing POST request: {e}")
+            http_log.error("Error processing POST request: %s", e)
             self.send_response(500)
             self.send_header('Content-type', 'text/html')
             self.send_header('Access-Control-Allow-Origin', '*')
             self.end_headers()
             self.wfile.write(b'Internal Server Error')
 
-def run_server(port=8000):
+def run_server(port=8000, max_workers=8):
     server_address = ('', port)
-    httpd = HTTPServer(server_address, RequestHandler)
-    print(f'Starting server on port {port}...')
+    httpd = PooledHTTPServer(server_address, RequestHandler, max_workers=max_workers)
+    install_shutdown_signals()
+    logger.info('Starting server on port %s with %s workers...', port, max_workers)
     try:
-    httpd.serve_forever()
+        httpd.serve_forever()
     except KeyboardInterrupt:
-        print("Shutting down server...")
+        logger.info("Shutting down server...")
+    finally:
         httpd.server_close()
 
 if __name__ == '__main__':
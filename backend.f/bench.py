@@ -0,0 +1,310 @@
+"""End-to-end benchmark of the backend against the simulated MCU.
+
+Starts an MCUSimulator, runs the production backend as a subprocess on
+its pty and measures:
+
+    frames    how many UART frames per second the backend applies, and the
+              backend CPU time spent per frame
+    latency   time from a sensor frame leaving the MCU to the new value
+              arriving on /stream, as percentiles
+    http      requests per second and latency percentiles for the polled
+              GET endpoints under concurrent keep-alive clients, while the
+              simulator keeps sending at its normal rates
+
+    python bench.py --save baseline.json
+    python bench.py --compare baseline.json   # exit status 1 on a regression
+    python bench.py --runtime asyncio         # the single event loop runtime
+    python bench.py --framing binary          # negotiated binary UART frames
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from mcu_sim import MCUSimulator
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BACKEND = os.path.join(HERE, '..', 'README.md')
+HTTP_ENDPOINTS = ('/getdata', '/getgauge', '/getmainstatus', '/getghconfig')
+# Raw pressure values used to tag frames; far outside what the simulator sends
+MARKER_BASE = 5000
+
+# metric -> True if higher is better
+METRICS = {
+    'frames.frames_per_s': True,
+    'frames.cpu_us_per_frame': False,
+    'latency.p50_ms': False,
+    'latency.p99_ms': False,
+    'http.requests_per_s': True,
+    'http.p50_ms': False,
+    'http.p99_ms': False,
+}
+
+
+def percentile(values, q):
+    """q-th percentile (0-100) of values by nearest rank; None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+class Backend:
+    """The production backend running as a child process on the simulator's pty."""
+
+    def __init__(self, script, uart_port, http_port, log_level='WARNING', runtime='threads',
+                 framing='ascii'):
+        self.http_port = http_port
+        self.workdir = tempfile.mkdtemp(prefix='backend-bench-')
+        env = dict(os.environ,
+                   PYTHONPATH=os.pathsep.join(filter(None, [HERE, os.environ.get('PYTHONPATH')])),
+                   BACKEND_UART_PORT=uart_port,
+                   BACKEND_HTTP_PORT=str(http_port),
+                   BACKEND_LOG_LEVEL=log_level,
+                   BACKEND_RUNTIME=runtime,
+                   BACKEND_UART_FRAMING=framing)
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(script)], cwd=self.workdir, env=env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def wait_ready(self, timeout=20.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"backend exited with status {self.process.returncode}")
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', self.http_port, timeout=1)
+                conn.request('GET', '/getdata')
+                conn.getresponse().read()
+                conn.close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError("backend did not start listening")
+
+    def cpu_seconds(self):
+        """User + system CPU time of the backend so far (Linux /proc), or None."""
+        try:
+            with open(f'/proc/{self.process.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def get_json(self, path, conn=None):
+        conn = conn or http.client.HTTPConnection('127.0.0.1', self.http_port, timeout=5)
+        conn.request('GET', path)
+        return json.loads(conn.getresponse().read())
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def bench_frames(sim, backend, frames=20000, burst=50):
+    """Send frames as fast as the backend takes them; the last one carries a marker."""
+    marker = MARKER_BASE + 1
+    cpu_before = backend.cpu_seconds()
+    started = time.perf_counter()
+    sent = 0
+    while sent < frames - 1:
+        n = min(burst, frames - 1 - sent)
+        sim.send_many([sim.status_frame(1 + i % 2) for i in range(n)])
+        sent += n
+    sim.send(sim.status_frame(1, pressure=marker))
+    sent += 1
+    conn = http.client.HTTPConnection('127.0.0.1', backend.http_port, timeout=5)
+    while backend.get_json('/getdata', conn).get('PressureGPH1') != marker / 10:
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    cpu_after = backend.cpu_seconds()
+    cpu = None if cpu_before is None or cpu_after is None else cpu_after - cpu_before
+    return {
+        'frames': sent,
+        'seconds': round(elapsed, 3),
+        'frames_per_s': round(sent / elapsed, 1),
+        'cpu_us_per_frame': None if cpu is None else round(cpu / sent * 1e6, 2),
+    }
+
+
+def bench_latency(sim, backend, samples=200, rate=20.0):
+    """Sensor frame -> /stream event latency for tagged gh1 pressure values."""
+    sent_at = {}
+    latencies = []
+    done = threading.Event()
+
+    def listen():
+        conn = http.client.HTTPConnection('127.0.0.1', backend.http_port, timeout=10)
+        conn.request('GET', '/stream')
+        response = conn.getresponse()
+        ready.set()
+        while not done.is_set():
+            line = response.fp.readline()
+            if not line:
+                return
+            if not line.startswith(b'data: '):
+                continue
+            received = time.perf_counter()
+            pressure = json.loads(line[6:]).get('PressureGPH1')
+            sent = sent_at.pop(pressure, None)
+            if sent is not None:
+                latencies.append(received - sent)
+        conn.close()
+
+    ready = threading.Event()
+    listener = threading.Thread(target=listen, daemon=True)
+    listener.start()
+    ready.wait(5)
+    time.sleep(0.3)  # Let the initial full-state event go by
+    for i in range(samples):
+        value = MARKER_BASE + 100 + i
+        sent_at[value / 10] = time.perf_counter()
+        sim.send(sim.status_frame(1, pressure=value))
+        time.sleep(1.0 / rate)
+    time.sleep(0.5)
+    done.set()
+    return {
+        'sent': samples,
+        'seen': len(latencies),  # /stream coalesces, so not every value is delivered
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p90_ms': _ms(percentile(latencies, 90)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'max_ms': _ms(max(latencies, default=None)),
+    }
+
+
+def bench_http(sim, backend, clients=8, seconds=10.0):
+    """Concurrent keep-alive GET clients while the simulator sends at its normal rates."""
+    latencies = {path: [] for path in HTTP_ENDPOINTS}
+    errors = [0]
+    stop_at = time.monotonic() + seconds
+
+    def client(offset):
+        conn = http.client.HTTPConnection('127.0.0.1', backend.http_port, timeout=10)
+        i = offset
+        while time.monotonic() < stop_at:
+            path = HTTP_ENDPOINTS[i % len(HTTP_ENDPOINTS)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors[0] += 1
+            except (OSError, http.client.HTTPException):
+                errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', backend.http_port, timeout=10)
+                continue
+            latencies[path].append(time.perf_counter() - started)
+        conn.close()
+
+    frames_before = sim.frames_sent
+    cpu_before = backend.cpu_seconds()
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    cpu_after = backend.cpu_seconds()
+    everything = [t for values in latencies.values() for t in values]
+    return {
+        'clients': clients,
+        'requests': len(everything),
+        'errors': errors[0],
+        'requests_per_s': round(len(everything) / elapsed, 1),
+        'p50_ms': _ms(percentile(everything, 50)),
+        'p99_ms': _ms(percentile(everything, 99)),
+        'endpoints': {path: {'p50_ms': _ms(percentile(values, 50)), 'p99_ms': _ms(percentile(values, 99))}
+                      for path, values in latencies.items()},
+        'uart_frames': sim.frames_sent - frames_before,
+        'cpu_percent': None if cpu_before is None else round((cpu_after - cpu_before) / elapsed * 100, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """List of regressions beyond tolerance (a fraction) relative to baseline."""
+    regressions = []
+    for metric, higher_is_better in METRICS.items():
+        section, name = metric.split('.')
+        new = results.get(section, {}).get(name)
+        old = baseline.get(section, {}).get(name)
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append(f"{metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend against the simulated MCU")
+    parser.add_argument('--backend', default=DEFAULT_BACKEND, help="backend script to run")
+    parser.add_argument('--http-port', type=int, default=8765)
+    parser.add_argument('--frames', type=int, default=20000)
+    parser.add_argument('--latency-samples', type=int, default=200)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10.0, help="duration of the HTTP load phase")
+    parser.add_argument('--status-rate', type=float, default=20.0, help="status frames/s during the HTTP phase")
+    parser.add_argument('--log-level', default='WARNING', help="BACKEND_LOG_LEVEL for the backend")
+    parser.add_argument('--runtime', default='threads', choices=('threads', 'asyncio'),
+                        help="BACKEND_RUNTIME for the backend")
+    parser.add_argument('--framing', default='ascii', choices=('ascii', 'binary'),
+                        help="BACKEND_UART_FRAMING for the backend")
+    parser.add_argument('--save', metavar='FILE', help="write the results as JSON")
+    parser.add_argument('--compare', metavar='FILE', help="baseline JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+
+    sim = MCUSimulator(rates={'status': args.status_rate}, seed=1).start(emit=False)
+    backend = Backend(args.backend, sim.port_name, args.http_port, args.log_level, args.runtime,
+                      args.framing)
+    try:
+        backend.wait_ready()
+        results = {}
+        print("frames ...", flush=True)
+        results['frames'] = bench_frames(sim, backend, args.frames)
+        print("latency ...", flush=True)
+        results['latency'] = bench_latency(sim, backend, args.latency_samples)
+        print("http ...", flush=True)
+        sim.start_emitters()
+        results['http'] = bench_http(sim, backend, args.clients, args.seconds)
+    finally:
+        backend.stop()
+        sim.close()
+
+    print(json.dumps(results, indent=2))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Compact binary UART framing with CRC and sequence numbers.
+
+A binary frame carries the same flag and raw (already fixed-point) values
+as an ASCII "flag;v1;v2;..." line:
+
+    0xA5 | length | seq | flag | value * n (int16, little endian) | CRC-16
+                                 `--------- length bytes --------'
+
+The CRC is CRC-16/CCITT-FALSE over length..values.  seq counts 0-255 per
+direction, so the receiver can tell dropped and duplicated frames apart
+from good ones.  ASCII text never contains 0xA5, which lets one decoder
+read both formats from the same stream: ASCII stays usable as a fallback
+and while the two ends are switching over.
+
+Binary mode is negotiated with the ASCII frame "51;1": the backend asks,
+and switches its own output once the MCU answers with "51;1".  "51;0"
+from either end returns to ASCII, and so do ASCII frames from an MCU that
+restarted in ASCII mode, after which the backend asks again.
+"""
+import binascii
+import logging
+import struct
+
+logger = logging.getLogger('backend.uart')
+
+SYNC = 0xA5
+FRAMING_FLAG = 51
+MAX_VALUES = 32
+_HEADER = struct.Struct('<BBBB')
+_CRC = struct.Struct('<H')
+_INT16 = (-0x8000, 0x7FFF)
+_VALUES = [struct.Struct(f'<{n}h') for n in range(MAX_VALUES + 1)]
+
+
+def crc16(data, crc=0xFFFF):
+    """CRC-16/CCITT-FALSE of data."""
+    return binascii.crc_hqx(data, crc)
+
+
+def encodable(values):
+    """True if values fit a binary frame (at most MAX_VALUES int16s)."""
+    return len(values) <= MAX_VALUES and all(
+        isinstance(v, int) and _INT16[0] <= v <= _INT16[1] for v in values)
+
+
+def encode(flag, values, seq):
+    """Binary frame for flag and its raw integer values."""
+    payload = _VALUES[len(values)].pack(*values)
+    body = _HEADER.pack(SYNC, len(payload), seq & 0xFF, flag)
+    return body + payload + _CRC.pack(crc16(body[1:] + payload))
+
+
+class FrameDecoder:
+    """Splits a byte stream into ASCII lines (str) and binary frames ((flag, values)).
+
+    Binary frames with a bad CRC are dropped and counted; the decoder then
+    resynchronises on the next 0xA5.  Sequence gaps are counted as dropped
+    frames and a repeated sequence number as a duplicate, which is not
+    returned.  A jump backwards means the sender started counting again
+    (the MCU restarted), so the decoder follows the new sequence.
+    """
+
+    def __init__(self, max_line=4096):
+        self.max_line = max_line
+        self._buffer = bytearray()
+        self._last_seq = None
+        self.frames = 0
+        self.crc_errors = 0
+        self.dropped = 0
+        self.duplicates = 0
+
+    def feed(self, chunk):
+        """Add received bytes; returns the complete lines and frames, in order."""
+        buffer = self._buffer
+        buffer += chunk
+        out = []
+        pos = 0
+        end = len(buffer)
+        while pos < end:
+            sync = buffer.find(SYNC, pos)
+            text_end = end if sync < 0 else sync
+            if text_end > pos:
+                newline = buffer.rfind(b'\n', pos, text_end)
+                if newline >= 0:
+                    out.extend(self._lines(buffer[pos:newline]))
+                    pos = newline + 1
+                if sync < 0:
+                    break
+                if pos < sync:
+                    # Text cut off by a binary frame; it can't be a complete line
+                    logger.debug("Discarding %d bytes of partial ASCII before a binary frame", sync - pos)
+                    pos = sync
+            # A binary frame starts at pos
+            if end - pos < _HEADER.size:
+                break
+            length = buffer[pos + 1]
+            if length % 2 or length > MAX_VALUES * 2:
+                pos += 1  # Not a real frame start; resync on the next 0xA5
+                continue
+            frame_end = pos + _HEADER.size + length + _CRC.size
+            if frame_end > end:
+                break
+            (crc,) = _CRC.unpack_from(buffer, frame_end - _CRC.size)
+            if crc != crc16(memoryview(buffer)[pos + 1:frame_end - _CRC.size]):
+                self.crc_errors += 1
+                pos += 1
+                continue
+            _, _, seq, flag = _HEADER.unpack_from(buffer, pos)
+            values = list(_VALUES[length // 2].unpack_from(buffer, pos + _HEADER.size))
+            pos = frame_end
+            if self._check_seq(seq):
+                self.frames += 1
+                out.append((flag, values))
+        del buffer[:pos]
+        if len(buffer) > self.max_line and buffer.find(SYNC) < 0:
+            logger.warning("Dropping %d bytes of UART input without a line break", len(buffer))
+            buffer.clear()
+        return out
+
+    def _lines(self, data):
+        lines = [line.decode('utf-8', 'replace').strip() for line in data.split(b'\n')]
+        return [line for line in lines if line]
+
+    def _check_seq(self, seq):
+        last = self._last_seq
+        self._last_seq = seq
+        if last is None:
+            return True
+        gap = (seq - last) & 0xFF
+        if gap == 0:
+            self.duplicates += 1
+            return False
+        if gap > 0x80:
+            logger.info("UART sequence restarted at %s after %s", seq, last)
+            return True
+        if gap > 1:
+            self.dropped += gap - 1
+            logger.warning("UART sequence jumped from %s to %s, %s frames lost", last, seq, gap - 1)
+        return True
+
+    def reset_sequence(self):
+        """Forget the last sequence number, e.g. after the MCU restarted."""
+        self._last_seq = None
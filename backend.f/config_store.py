@@ -0,0 +1,235 @@
+"""Settings persisted across restarts as a snapshot file plus a change journal.
+
+Two files live in the store directory:
+
+    settings.json     {"seq": n, "settings": {name: value}}; always complete,
+                      because it is written to a temporary file, fsynced and
+                      renamed over the previous one
+    settings.journal  one JSON line per change, {"seq": n, "set": {name: value}},
+                      holding only the settings that changed
+
+load() reads the snapshot and replays the journal entries newer than it,
+which takes well under a millisecond for a settings-sized document.  A line
+torn by a power cut in the middle of an append is dropped.  Once the journal
+holds compact_after entries the current settings become the new snapshot
+and the journal starts over.
+
+record() only hands the latest settings to a background thread and
+returns, so callers never wait for the disk; bursts of changes are written
+as one journal entry.  While writing fails the thread retries with a
+growing delay, and an append cut short is truncated off the journal so it
+can't hide the entries after it.
+"""
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger('backend.settings')
+
+# Wait between attempts while the disk keeps failing (full, read-only)
+RETRY_INITIAL = 0.5
+RETRY_MAX = 30.0
+
+SNAPSHOT = 'settings.json'
+JOURNAL = 'settings.journal'
+
+
+def _fsync_directory(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class ConfigStore:
+    """Durable {name: JSON value} settings, written on their own thread."""
+
+    def __init__(self, directory, compact_after=256, name='settings-writer'):
+        self.directory = directory
+        self.compact_after = compact_after
+        self.name = name
+        self._snapshot_path = os.path.join(directory, SNAPSHOT)
+        self._journal_path = os.path.join(directory, JOURNAL)
+        self._cond = threading.Condition()
+        self._stored = {}       # Every setting in the snapshot and journal
+        self._saved = {}        # Settings record() calls are compared against
+        self._latest = None     # Newest settings handed to record()
+        self._seq = 0
+        self._entries = 0       # Journal entries since the last snapshot
+        self._journal = None
+        self._journal_length = 0  # Bytes of complete entries in the journal
+        self._busy = False
+        self._running = False
+        self._thread = None
+
+    def load(self):
+        """Return the persisted settings ({} on first start) and open the journal for appending."""
+        os.makedirs(self.directory, exist_ok=True)
+        settings, seq = {}, 0
+        try:
+            with open(self._snapshot_path, 'rb') as f:
+                document = json.load(f)
+            settings, seq = dict(document['settings']), int(document['seq'])
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error("Ignoring unreadable settings snapshot %s: %s", self._snapshot_path, e)
+        good_length = 0
+        try:
+            with open(self._journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        entry_seq, changes = int(entry['seq']), entry['set']
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning("Settings journal ends in a partial entry; dropping it")
+                        break
+                    good_length += len(line)
+                    self._entries += 1
+                    if entry_seq > seq:
+                        settings.update(changes)
+                        seq = entry_seq
+        except FileNotFoundError:
+            pass
+        self._journal = open(self._journal_path, 'ab')
+        # Appends must continue after the last complete entry
+        self._journal.truncate(good_length)
+        self._journal_length = good_length
+        self._stored = settings
+        self._saved = dict(settings)
+        self._latest = dict(settings)
+        self._seq = seq
+        return dict(settings)
+
+    def assume_saved(self, settings):
+        """Compare later record() calls against settings without writing them.
+
+        Call after load() with the values in effect at startup, so only
+        settings that really change get journaled; the rest keep following
+        the defaults in the code.
+        """
+        with self._cond:
+            self._saved = self._latest = settings
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def record(self, settings):
+        """Persist settings ({name: value}) soon; returns immediately.
+
+        The values must not be changed afterwards; pass copies such as
+        the values of a published snapshot.
+        """
+        with self._cond:
+            if settings == self._latest:
+                return
+            self._latest = settings
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until everything recorded so far is on disk; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(self._idle, timeout)
+
+    def close(self, timeout=5.0):
+        """Write what is still pending, then stop the writer thread."""
+        self.flush(timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _idle(self):
+        return not self._busy and (self._latest is None or self._latest == self._saved)
+
+    def _run(self):
+        retry = None    # Seconds to wait before the next attempt while writes fail
+        while True:
+            with self._cond:
+                if retry is not None:
+                    self._cond.wait_for(lambda: not self._running, retry)
+                self._cond.wait_for(lambda: not self._running or not self._idle())
+                if not self._running:
+                    return
+                latest = self._latest
+                self._busy = True
+            try:
+                self._write(latest)
+                if retry is not None:
+                    logger.info("Persisting settings works again")
+                retry = None
+            except Exception:
+                if retry is None:
+                    logger.exception("Failed to persist settings; retrying quietly")
+                retry = RETRY_INITIAL if retry is None else min(retry * 2, RETRY_MAX)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write(self, settings):
+        changes = {name: value for name, value in settings.items() if self._saved.get(name) != value}
+        if not changes:
+            self._saved = settings
+            return
+        line = json.dumps({"seq": self._seq + 1, "set": changes}, separators=(',', ':')) + '\n'
+        data = line.encode()
+        try:
+            self._journal.write(data)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        except (OSError, ValueError):  # ValueError: closed after an earlier failed rewind
+            self._rewind_journal()
+            raise
+        self._journal_length += len(data)
+        self._seq += 1
+        self._stored.update(changes)
+        self._saved = settings
+        self._entries += 1
+        if self._entries >= self.compact_after:
+            self._compact()
+
+    def _rewind_journal(self):
+        """Drop a partly written entry, so the journal ends after its last complete one."""
+        try:
+            self._journal.close()
+        except OSError:
+            pass  # The unwritten rest of the entry is discarded with the buffer
+        self._journal = open(self._journal_path, 'ab')
+        try:
+            self._journal.truncate(self._journal_length)
+        except OSError as e:
+            logger.warning("Could not truncate the settings journal: %s", e)
+
+    def _compact(self):
+        """Write the stored settings as the new snapshot and empty the journal."""
+        temporary = self._snapshot_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({"seq": self._seq, "settings": self._stored}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self._snapshot_path)
+        _fsync_directory(self.directory)
+        # Entries up to seq are in the snapshot now; load() skips any that survive a crash here
+        self._journal.truncate(0)
+        self._journal.seek(0)
+        self._journal_length = 0
+        os.fsync(self._journal.fileno())
+        self._entries = 0
+        logger.debug("Compacted settings journal at seq %s", self._seq)
@@ -0,0 +1,86 @@
+"""Display power (screen blanking / DPMS) changes applied off the request path.
+
+request() only records the wanted setting and returns.  A background
+thread applies it once no new request has arrived for `debounce` seconds,
+so a burst of eco-mode toggles costs one xset call with the final value,
+and a request for the setting already in effect costs nothing.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger('backend.display')
+
+_UNSET = object()
+
+
+class DisplayPowerManager:
+    """Applies the most recently requested setting with apply(setting) on its own thread."""
+
+    def __init__(self, apply, debounce=0.5, name='display-power'):
+        self._apply = apply
+        self.debounce = debounce
+        self.name = name
+        self._cond = threading.Condition()
+        self._wanted = _UNSET
+        self._applied = _UNSET
+        self._requested_at = 0.0
+        self._busy = False
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def request(self, setting):
+        """Ask for setting to be applied; returns immediately."""
+        with self._cond:
+            self._wanted = setting
+            self._requested_at = time.monotonic()
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until the latest requested setting has been applied (or failed); False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(self._idle, timeout)
+
+    def _idle(self):
+        return not self._busy and (self._wanted is _UNSET or self._wanted == self._applied)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._running or not self._idle())
+                if not self._running:
+                    return
+                # Wait for the requests to settle before acting on the latest one
+                while True:
+                    remaining = self._requested_at + self.debounce - time.monotonic()
+                    if remaining <= 0 or not self._running:
+                        break
+                    self._cond.wait(remaining)
+                setting = self._wanted
+                if setting == self._applied:
+                    continue
+                self._busy = True
+            try:
+                self._apply(setting)
+            except Exception:
+                logger.exception("Applying display power setting %r failed", setting)
+            with self._cond:
+                # Recorded even on failure so a broken xset is not retried in a loop
+                self._applied = setting
+                self._busy = False
+                self._cond.notify_all()
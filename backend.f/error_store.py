@@ -0,0 +1,99 @@
+"""Persistent, bounded history of the errors reported by the MCU (flag 20).
+
+Entries live in a small SQLite database with indexes on error code and
+time, so every query is an index range scan of at most `limit` rows no
+matter how long the machine has been running.  Once max_entries errors
+are stored, each new one removes the oldest.
+
+Entry ids only grow, which makes them usable as pagination cursors:
+`before` pages back through older entries and `since` returns entries
+newer than the last one a client has seen.
+"""
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS errors (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    row INTEGER NOT NULL,
+    code TEXT NOT NULL,
+    description TEXT NOT NULL,
+    date TEXT NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS errors_code ON errors (code, id);
+CREATE INDEX IF NOT EXISTS errors_ts ON errors (ts);
+"""
+
+
+class ErrorStore:
+    """SQLite-backed error log shared by the UART and HTTP threads."""
+
+    def __init__(self, path, max_entries=10000, clock=time.time):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def add(self, row, code, description, date, ts=None):
+        """Store one error and return its id."""
+        if ts is None:
+            ts = self.clock()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO errors (row, code, description, date, ts) VALUES (?, ?, ?, ?, ?)",
+                (row, code, description, date, ts))
+            new_id = cursor.lastrowid
+            # Ids are consecutive, so this drops at most one row once the store is full
+            self._db.execute("DELETE FROM errors WHERE id <= ?", (new_id - self.max_entries,))
+        return new_id
+
+    def query(self, limit=100, before=None, since=None, codes=None, start=None, end=None):
+        """Up to limit entries, oldest first, matching all of the given filters.
+
+        before/since are entry ids: with since the page starts right after
+        that entry, otherwise it holds the newest matches older than before
+        (or the newest overall).
+        """
+        where, args = [], []
+        if before is not None:
+            where.append("id < ?")
+            args.append(before)
+        if since is not None:
+            where.append("id > ?")
+            args.append(since)
+        if codes:
+            where.append(f"code IN ({','.join('?' * len(codes))})")
+            args.extend(codes)
+        if start is not None:
+            where.append("ts >= ?")
+            args.append(start)
+        if end is not None:
+            where.append("ts <= ?")
+            args.append(end)
+        sql = "SELECT id, row, code, description, date, ts FROM errors"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        # Walking forward from a since cursor keeps the page contiguous with what the client has
+        sql += " ORDER BY id ASC LIMIT ?" if since is not None else " ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        entries = [dict(r) for r in rows]
+        if since is None:
+            entries.reverse()
+        return entries
+
+    def latest_id(self):
+        with self._lock:
+            row = self._db.execute("SELECT MAX(id) FROM errors").fetchone()
+        return row[0] or 0
@@ -0,0 +1,138 @@
+"""The fleet gateway against locally spawned backends.
+
+Starts --machines MCUSimulators, each with the production backend as a
+subprocess on its pty, and a FleetGateway following all of them, then
+measures:
+
+    connect   seconds from gateway start until every machine is online
+    latency   time from a sensor frame leaving one machine's MCU to the new
+              value showing in the gateway's merged view, as percentiles
+    fan_out   POST /fleet/saveghconfig to every machine at once: duration,
+              failures, and how many MCUs received the config frame
+
+    python fleet_bench.py --machines 20
+    python fleet_bench.py --machines 50 --runtime asyncio
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+
+from bench import DEFAULT_BACKEND, MARKER_BASE, Backend, _ms, percentile
+from fleet_gateway import FleetGateway, GatewayHandler
+from http_server import PooledHTTPServer
+from mcu_sim import MCUSimulator
+
+
+def wait_online(gateway, timeout=60.0):
+    started = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        _, machines = gateway.view.read()
+        if all(entry['online'] and entry['data'] for entry in machines.values()):
+            return time.perf_counter() - started
+        time.sleep(0.02)
+    offline = [name for name, entry in gateway.view.read()[1].items() if not entry['online']]
+    raise RuntimeError(f"machines still offline: {', '.join(offline)}")
+
+
+def bench_latency(sims, gateway, samples=100, rate=10.0):
+    """Sensor frame -> value visible in gateway.view, round robin over the machines."""
+    latencies = []
+    names = list(sims)
+    for i in range(samples):
+        name = names[i % len(names)]
+        value = MARKER_BASE + 100 + i
+        sent = time.perf_counter()
+        sims[name].send(sims[name].status_frame(1, pressure=value))
+        deadline = time.monotonic() + 5.0
+        while time.monotonic() < deadline:
+            if gateway.view.entry(name)['data'].get('PressureGPH1') == value / 10:
+                latencies.append(time.perf_counter() - sent)
+                break
+            time.sleep(0.001)
+        time.sleep(1.0 / rate)
+    return {
+        'sent': samples,
+        'seen': len(latencies),
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p90_ms': _ms(percentile(latencies, 90)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+    }
+
+
+def bench_fan_out(sims, port):
+    temperature = 93.5
+    for sim in sims.values():
+        sim.received.clear()
+    body = json.dumps({'gh_id': 'gh1', 'config': {'temperature': temperature}})
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    started = time.perf_counter()
+    conn.request('POST', '/fleet/saveghconfig', body, {'Content-Type': 'application/json'})
+    response = json.loads(conn.getresponse().read())
+    elapsed = time.perf_counter() - started
+    time.sleep(0.5)  # Let the config frames reach the MCUs
+    delivered = sum(any(line.startswith('1;') for line in sim.received) for sim in sims.values())
+    return {
+        'machines': len(sims),
+        'seconds': round(elapsed, 3),
+        'failed': len(response['failed']),
+        'mcus_configured': delivered,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fleet gateway against local backends")
+    parser.add_argument('--backend', default=DEFAULT_BACKEND, help="backend script to run")
+    parser.add_argument('--machines', type=int, default=10)
+    parser.add_argument('--first-port', type=int, default=8900, help="HTTP port of the first backend")
+    parser.add_argument('--gateway-port', type=int, default=8899)
+    parser.add_argument('--latency-samples', type=int, default=100)
+    parser.add_argument('--runtime', default='threads', choices=('threads', 'asyncio'),
+                        help="BACKEND_RUNTIME for the backends")
+    parser.add_argument('--log-level', default='WARNING', help="BACKEND_LOG_LEVEL for the backends")
+    parser.add_argument('--save', metavar='FILE', help="write the results as JSON")
+    args = parser.parse_args()
+
+    sims, backends = {}, []
+    httpd = gateway = None
+    try:
+        for i in range(args.machines):
+            name = f'machine{i + 1}'
+            sims[name] = MCUSimulator(seed=i).start(emit=False)
+            backends.append(Backend(args.backend, sims[name].port_name, args.first_port + i,
+                                    args.log_level, args.runtime))
+        for backend in backends:
+            backend.wait_ready()
+        controllers = {name: ('127.0.0.1', args.first_port + i) for i, name in enumerate(sims)}
+        gateway = FleetGateway(controllers).start()
+        httpd = PooledHTTPServer(('127.0.0.1', args.gateway_port), GatewayHandler)
+        httpd.gateway = gateway
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        results = {}
+        print("connect ...", flush=True)
+        results['connect'] = {'machines': args.machines, 'seconds': round(wait_online(gateway), 3)}
+        print("latency ...", flush=True)
+        results['latency'] = bench_latency(sims, gateway, args.latency_samples)
+        print("fan out ...", flush=True)
+        results['fan_out'] = bench_fan_out(sims, args.gateway_port)
+    finally:
+        if httpd is not None:
+            httpd.shutdown()
+            httpd.server_close()
+        if gateway is not None:
+            gateway.stop()
+        for backend in backends:
+            backend.stop()
+        for sim in sims.values():
+            sim.close()
+
+    print(json.dumps(results, indent=2))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
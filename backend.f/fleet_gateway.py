@@ -0,0 +1,607 @@
+"""Gateway serving many controllers (backend instances) as one API.
+
+Each controller's state is followed over its /stream Server-Sent Events,
+whose first event is the whole /getdata state and later ones what changed,
+so changes are pushed to the gateway as they happen instead of being polled;
+a controller whose stream is unavailable (all subscriber slots taken) is
+polled on /getdata with If-None-Match instead.  /geterrors?since=<id> and
+/getservicedata have no push channel and are polled every poll_interval
+seconds over a small pool of keep-alive connections per controller, which
+the fan-out config pushes reuse.
+
+All controller I/O runs as tasks on one asyncio event loop in a background
+thread, so hundreds of controllers cost hundreds of sockets rather than
+hundreds of threads.  The merged state lives in a FleetView: every change
+bumps its version, and the dashboard endpoints are served from it by a
+PooledHTTPServer:
+
+    GET  /fleet/machines           connection status of every controller
+    GET  /fleet/getdata            {"version": v, "machines": {name: {...}}}, with ETag;
+                                   ?since=<v> returns only machines changed after v
+    GET  /fleet/geterrors          recent errors of all machines, oldest first
+    GET  /fleet/getservicedata     {name: /getservicedata of that machine}
+    POST /fleet/saveghconfig       the /saveghconfig body, plus an optional
+                                   "machines": [names] (default: all), sent to
+                                   every machine concurrently
+    POST /fleet/saveconfig         likewise for /saveconfig and /savemainconfig
+    POST /fleet/savemainconfig
+
+    python fleet_gateway.py --port 8100 cafe1=10.0.0.11:8000 cafe2=10.0.0.12:8000
+    python fleet_gateway.py --port 8100 --file machines.json   # {"cafe1": "10.0.0.11:8000", ...}
+"""
+import argparse
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from http_server import KeepAliveRequestHandler, PooledHTTPServer, install_shutdown_signals
+from routes import RouteTable, split_target
+from snapshots import SnapshotCache
+
+logger = logging.getLogger('backend.fleet')
+
+FAN_OUT_PATHS = ('/saveghconfig', '/saveconfig', '/savemainconfig')
+# Recent errors kept per machine for /fleet/geterrors
+ERRORS_KEPT = 50
+_MAX_BODY = 1 << 22
+
+
+class ControllerError(Exception):
+    """A controller could not be reached or gave an unusable answer."""
+
+
+async def _read_head(reader):
+    """(status, {lower-case header name: value}) of an HTTP response."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        status = int(lines[0].split(' ', 2)[1])
+    except (IndexError, ValueError):
+        raise ControllerError(f"bad status line {lines[0]!r}")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+
+class _Connection:
+    """One keep-alive HTTP/1.1 client connection, one request at a time."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+        self.requests = 0
+
+    async def request(self, method, target, body=None, headers=()):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            self.requests = 0
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        if body is not None:
+            lines.append("Content-Type: application/json")
+            lines.append(f"Content-Length: {len(body)}")
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b''))
+        self.requests += 1
+        status, response_headers = await _read_head(self.reader)
+        if 'content-length' in response_headers:
+            length = int(response_headers['content-length'])
+            if length > _MAX_BODY:
+                raise ControllerError(f"response of {length} bytes is too large")
+            data = await self.reader.readexactly(length)
+        elif status in (204, 304):
+            data = b''
+        else:
+            data = await self.reader.read()
+            response_headers['connection'] = 'close'
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, response_headers, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class FleetView:
+    """Merged, versioned state of every controller.
+
+    Written from the gateway's event loop and read by HTTP worker threads.
+    A machine's entry is replaced on every change, never modified in place,
+    so a reader holding one always sees a consistent record.
+    """
+
+    def __init__(self, controllers):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._machines = {name: {'address': f"{host}:{port}", 'online': False, 'mode': None,
+                                 'problem': None, 'last_seen': None, 'version': 0,
+                                 'data': {}, 'service': {}, 'errors': ()}
+                          for name, (host, port) in controllers.items()}
+
+    def update(self, name, **fields):
+        """Replace fields of a machine's entry and bump the version; returns the new version."""
+        with self._lock:
+            self._version += 1
+            entry = dict(self._machines[name])
+            entry.update(fields)
+            entry['version'] = self._version
+            self._machines[name] = entry
+            return self._version
+
+    def merge_data(self, name, changes, replace=False):
+        """Apply changed /getdata fields (or the whole state with replace) of a machine."""
+        with self._lock:
+            self._version += 1
+            entry = dict(self._machines[name])
+            entry['data'] = dict(changes) if replace else {**entry['data'], **changes}
+            entry['online'] = True
+            entry['last_seen'] = time.time()
+            entry['version'] = self._version
+            self._machines[name] = entry
+            return self._version
+
+    def add_errors(self, name, errors):
+        with self._lock:
+            self._version += 1
+            entry = dict(self._machines[name])
+            kept = entry['errors'] + tuple(dict(e, machine=name) for e in errors)
+            entry['errors'] = kept[-ERRORS_KEPT:]
+            entry['version'] = self._version
+            self._machines[name] = entry
+
+    def entry(self, name):
+        return self._machines[name]
+
+    def read(self):
+        """(version, {name: entry}) at one point in time."""
+        with self._lock:
+            return self._version, dict(self._machines)
+
+    @property
+    def version(self):
+        return self._version
+
+    def names(self):
+        return list(self._machines)
+
+
+class ControllerLink:
+    """The gateway's connections to one controller.
+
+    Runs two tasks: one following /stream (or polling /getdata when the
+    stream is refused) and one polling errors and service data.  request()
+    borrows a keep-alive connection from a pool of at most pool_size; each
+    one holds a worker of a threaded backend while it is open, so the
+    default is a single connection next to the stream.
+    """
+
+    def __init__(self, name, host, port, view, poll_interval=3.0, timeout=5.0, pool_size=1,
+                 stream_timeout=40.0, max_backoff=30.0):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.view = view
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        # The backend sends a keepalive comment every 15 s on an idle stream
+        self.stream_timeout = stream_timeout
+        self.max_backoff = max_backoff
+        self._slots = asyncio.Semaphore(pool_size)
+        self._idle = []
+        self._last_error_id = None
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._follow_state(), name=f'{self.name}-state'),
+                       asyncio.create_task(self._poll_extras(), name=f'{self.name}-poll')]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for connection in self._idle:
+            connection.close()
+        self._idle.clear()
+
+    async def request(self, method, target, body=None, headers=()):
+        """(status, headers, body) of one request on a pooled connection.
+
+        A request that fails on a reused connection is sent once more on a
+        new one: the controller may have closed it as idle in between.
+        """
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else _Connection(self.host, self.port)
+            try:
+                try:
+                    result = await asyncio.wait_for(
+                        connection.request(method, target, body, headers), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    if connection.requests <= 1:
+                        raise
+                    connection.close()
+                    result = await asyncio.wait_for(
+                        connection.request(method, target, body, headers), self.timeout)
+            except BaseException:
+                connection.close()
+                raise
+            if connection.writer is not None:
+                self._idle.append(connection)
+            return result
+
+    async def get_json(self, target):
+        status, headers, data = await self.request('GET', target)
+        if status != 200:
+            raise ControllerError(f"GET {target} answered {status}")
+        return headers, json.loads(data)
+
+    async def _follow_state(self):
+        backoff = 1.0
+        while True:
+            try:
+                if not await self._read_stream():
+                    # Stream refused: poll /getdata for a while, then ask again
+                    await self._poll_data(self.stream_timeout)
+                continue
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                    ValueError, ControllerError) as e:
+                problem = str(e) or type(e).__name__
+            if self.view.entry(self.name)['online']:
+                logger.warning("Lost %s (%s:%s): %s", self.name, self.host, self.port, problem)
+                backoff = 1.0
+            self.view.update(self.name, online=False, mode=None, problem=problem)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _read_stream(self):
+        """Apply /stream events until the connection ends; False if the stream was refused."""
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        try:
+            writer.write(f"GET /stream HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                         f"Accept: text/event-stream\r\n\r\n".encode('latin-1'))
+            status, _ = await asyncio.wait_for(_read_head(reader), self.timeout)
+            if status != 200:
+                logger.info("%s refused /stream (%s); polling /getdata", self.name, status)
+                return False
+            self.view.update(self.name, mode='stream', problem=None)
+            logger.info("Following %s (%s:%s)", self.name, self.host, self.port)
+            # The first event holds all of /getdata, later ones only what changed
+            first = True
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.stream_timeout)
+                if not line:
+                    raise ControllerError("stream closed")
+                if line.startswith(b'data: '):
+                    self.view.merge_data(self.name, json.loads(line[6:]), replace=first)
+                    first = False
+        finally:
+            writer.close()
+
+    async def _poll_data(self, duration):
+        etag = None
+        deadline = time.monotonic() + duration
+        self.view.update(self.name, mode='poll')
+        while time.monotonic() < deadline:
+            status, headers, data = await self.request(
+                'GET', '/getdata', headers=[('If-None-Match', etag)] if etag else ())
+            if status == 200:
+                etag = headers.get('etag')
+                self.view.merge_data(self.name, json.loads(data), replace=True)
+            elif status != 304:
+                raise ControllerError(f"GET /getdata answered {status}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _poll_extras(self):
+        while True:
+            try:
+                await self._poll_errors()
+                _, service = await self.get_json('/getservicedata')
+                if service != self.view.entry(self.name)['service']:
+                    self.view.update(self.name, service=service)
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                    ValueError, ControllerError) as e:
+                logger.debug("Polling %s failed: %s", self.name, e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _poll_errors(self):
+        if self._last_error_id is None:
+            target = f'/geterrors?limit={ERRORS_KEPT}'
+        else:
+            target = f'/geterrors?since={self._last_error_id}&limit=500'
+        headers, errors = await self.get_json(target)
+        if errors:
+            self._last_error_id = int(headers.get('x-last-id', errors[-1]['id']))
+            self.view.add_errors(self.name, errors)
+        elif self._last_error_id is None:
+            self._last_error_id = 0
+
+
+class FleetGateway:
+    """The ControllerLinks of every controller on one event loop thread."""
+
+    def __init__(self, controllers, poll_interval=3.0, timeout=5.0, pool_size=1, max_concurrent=64):
+        """controllers maps a machine name to (host, port)."""
+        self.controllers = dict(controllers)
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_concurrent = max_concurrent
+        self.view = FleetView(self.controllers)
+        self.snapshots = SnapshotCache()
+        self.links = {}
+        self.loop = None
+        self._thread = None
+        self._fan_out_slots = None
+
+    def start(self):
+        started = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self._start_links())
+            started.set()
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='fleet-loop', daemon=True)
+        self._thread.start()
+        started.wait()
+        logger.info("Gateway following %d controllers", len(self.controllers))
+        return self
+
+    async def _start_links(self):
+        self._fan_out_slots = asyncio.Semaphore(self.max_concurrent)
+        for name, (host, port) in self.controllers.items():
+            link = self.links[name] = ControllerLink(name, host, port, self.view, self.poll_interval,
+                                                     self.timeout, self.pool_size)
+            link.start()
+
+    def stop(self, timeout=5.0):
+        if self.loop is None:
+            return
+        stopping = asyncio.run_coroutine_threadsafe(self._stop_links(), self.loop)
+        try:
+            stopping.result(timeout)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+    async def _stop_links(self):
+        await asyncio.gather(*(link.stop() for link in self.links.values()))
+
+    def fan_out(self, names, path, params):
+        """POST params to path on every named machine at once; {name: result}.
+
+        Blocks the calling (HTTP worker) thread until every controller has
+        answered or timed out; at most max_concurrent requests are in flight.
+        """
+        body = json.dumps(params).encode()
+        future = asyncio.run_coroutine_threadsafe(self._fan_out(names, path, body), self.loop)
+        # Each wave of max_concurrent requests may take a retry, i.e. two timeouts
+        waves = -(-len(names) // self.max_concurrent)
+        return future.result(2 * self.timeout * waves + 1)
+
+    async def _fan_out(self, names, path, body):
+        results = await asyncio.gather(*(self._post(name, path, body) for name in names))
+        return dict(zip(names, results))
+
+    async def _post(self, name, path, body):
+        async with self._fan_out_slots:
+            try:
+                status, _, data = await self.links[name].request('POST', path, body)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                    ValueError, ControllerError) as e:
+                return {'ok': False, 'error': str(e) or type(e).__name__}
+        try:
+            response = json.loads(data)
+        except ValueError:
+            response = data.decode('utf-8', 'replace')
+        return {'ok': status == 200, 'status': status, 'response': response}
+
+
+routes = RouteTable()
+
+
+def machine_filter(query):
+    """Names from ?machine=a,b, or None for every machine."""
+    if 'machine' not in query:
+        return None
+    return {name for value in query['machine'] for name in value.split(',') if name}
+
+
+class GatewayHandler(KeepAliveRequestHandler):
+    """Dashboard API of the gateway; self.server.gateway is the FleetGateway."""
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
+
+    def dispatch(self):
+        path, query = split_target(self.path)
+        self.route = routes.match(self.command, path)
+        gateway = self.server.gateway
+        if self.route is None:
+            try:
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            except ValueError:
+                self.close_connection = True
+            methods = routes.methods(path)
+            if methods:
+                self.send_body(b'405 Method Not Allowed', 405, 'text/html', [('Allow', ', '.join(methods))])
+            else:
+                self.send_json({'error': 'Endpoint not found'}, 404)
+        elif self.command == 'POST':
+            try:
+                params = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                self.route.handler(self, gateway, params)
+            except Exception as e:
+                logger.error("Error processing POST %s: %s", self.path, e)
+                self.send_json({"status": "error", "message": str(e)}, 500)
+        else:
+            self.route.handler(self, gateway, query)
+
+    @routes.get('/fleet/machines')
+    def get_machines(self, gateway, query):
+        _, machines = gateway.view.read()
+        self.send_json([{'name': name, 'address': entry['address'], 'online': entry['online'],
+                         'mode': entry['mode'], 'problem': entry['problem'],
+                         'last_seen': entry['last_seen'], 'version': entry['version']}
+                        for name, entry in machines.items()])
+
+    @routes.get('/fleet/getdata')
+    def get_data(self, gateway, query):
+        # ?since=<version>: only the machines whose state changed after that version
+        wanted = machine_filter(query)
+        try:
+            since = int(query['since'][0]) if 'since' in query else None
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        if since is None and wanted is None:
+            self.send_json_snapshot(gateway.snapshots, 'getdata', gateway.view.version,
+                                    lambda: fleet_data(gateway.view))
+            return
+        self.send_json(fleet_data(gateway.view, since, wanted))
+
+    @routes.get('/fleet/geterrors')
+    def get_errors(self, gateway, query):
+        wanted = machine_filter(query)
+        try:
+            limit = max(1, min(int(query.get('limit', ['100'])[0]), 1000))
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        _, machines = gateway.view.read()
+        errors = [error for name, entry in machines.items() if wanted is None or name in wanted
+                  for error in entry['errors']]
+        errors.sort(key=lambda error: error.get('ts', 0))
+        self.send_json(errors[-limit:])
+
+    @routes.get('/fleet/getservicedata')
+    def get_service_data(self, gateway, query):
+        wanted = machine_filter(query)
+        _, machines = gateway.view.read()
+        self.send_json({name: entry['service'] for name, entry in machines.items()
+                        if wanted is None or name in wanted})
+
+    def fan_out(self, gateway, params):
+        # {"machines": [...], ...rest}: rest goes unchanged to every machine's endpoint
+        params = dict(params)
+        names = params.pop('machines', None)
+        if names is None:
+            names = gateway.view.names()
+        elif not isinstance(names, list):
+            self.send_json({'error': '"machines" must be a list of names'}, 400)
+            return
+        unknown = [name for name in names if name not in gateway.links]
+        if unknown:
+            self.send_json({'error': f"Unknown machines: {', '.join(unknown)}"}, 400)
+            return
+        path = self.route.path[len('/fleet'):]
+        results = gateway.fan_out(list(names), path, params)
+        failed = [name for name, result in results.items() if not result['ok']]
+        if failed:
+            logger.warning("%s failed on %d of %d machines: %s", path, len(failed), len(results),
+                           ', '.join(failed))
+        self.send_json({'success': not failed, 'failed': failed, 'results': results})
+
+
+for _path in FAN_OUT_PATHS:
+    routes.add('POST', '/fleet' + _path, GatewayHandler.fan_out)
+
+
+def fleet_data(view, since=None, wanted=None):
+    version, machines = view.read()
+    return {'version': version,
+            'machines': {name: {'online': entry['online'], 'version': entry['version'],
+                                'last_seen': entry['last_seen'], 'data': entry['data']}
+                         for name, entry in machines.items()
+                         if (since is None or entry['version'] > since)
+                         and (wanted is None or name in wanted)}}
+
+
+def parse_controllers(specs):
+    """{name: (host, port)} from "name=host:port" or "host:port" strings."""
+    controllers = {}
+    for spec in specs:
+        name, sep, address = spec.partition('=')
+        if not sep:
+            name, address = spec, spec
+        host, _, port = address.rpartition(':')
+        if not host or not port.isdigit():
+            raise ValueError(f"expected [name=]host:port, got {spec!r}")
+        if name in controllers:
+            raise ValueError(f"machine {name!r} is listed twice")
+        controllers[name] = (host, int(port))
+    return controllers
+
+
+def run_gateway(controllers, port=8100, max_workers=16, **options):
+    gateway = FleetGateway(controllers, **options).start()
+    httpd = PooledHTTPServer(('', port), GatewayHandler, max_workers=max_workers)
+    httpd.gateway = gateway
+    install_shutdown_signals()
+    logger.info("Fleet gateway on port %s", port)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down gateway...")
+    finally:
+        httpd.server_close()
+        gateway.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many backends as one API")
+    parser.add_argument('controllers', nargs='*', metavar='[NAME=]HOST:PORT')
+    parser.add_argument('--file', help='JSON object mapping machine names to "host:port"')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--workers', type=int, default=16, help="HTTP worker threads")
+    parser.add_argument('--poll-interval', type=float, default=3.0,
+                        help="seconds between error/service data polls of each machine")
+    parser.add_argument('--timeout', type=float, default=5.0, help="per-request timeout")
+    parser.add_argument('--max-concurrent', type=int, default=64,
+                        help="fan-out requests in flight at once")
+    args = parser.parse_args()
+
+    from log_setup import configure_logging
+    configure_logging('fleet_gateway.log')
+    specs = list(args.controllers)
+    if args.file:
+        with open(args.file) as f:
+            specs.extend(f"{name}={address}" for name, address in json.load(f).items())
+    try:
+        controllers = parse_controllers(specs)
+    except ValueError as e:
+        parser.error(str(e))
+    if not controllers:
+        parser.error("no controllers given")
+    run_gateway(controllers, args.port, args.workers, poll_interval=args.poll_interval,
+                timeout=args.timeout, max_concurrent=args.max_concurrent)
+
+
+if __name__ == '__main__':
+    main()
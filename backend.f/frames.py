@@ -0,0 +1,153 @@
+"""Declarative schema for the ASCII "flag;v1;v2;..." UART frames.
+
+Each FrameSpec names the values carried by one flag, the scale each raw
+integer is divided by when decoding (and multiplied by when encoding) and,
+optionally, where each value is stored on the target object.  Decoding,
+storing and encoding are compiled once per flag, and FrameRegistry finds
+the spec for an incoming flag with a single dict lookup.
+"""
+
+
+class Field:
+    """One value of a frame.
+
+    scale:      raw value = decoded value * scale
+    target:     dotted path(s) on the dispatch target receiving the scaled value,
+                e.g. 'service_sensors.voltage' or ('Pressure1', 'uart_data.gh1.pressure')
+    raw_target: dotted path(s) receiving the value exactly as received
+    convert:    applied to the scaled value when decoding (e.g. int, bool)
+    width:      zero-padded width used when encoding
+    """
+    __slots__ = ('name', 'scale', 'target', 'raw_target', 'convert', 'width')
+
+    def __init__(self, name, scale=1, target=None, raw_target=None, convert=None, width=0):
+        self.name = name
+        self.scale = scale
+        self.target = target
+        self.raw_target = raw_target
+        self.convert = convert
+        self.width = width
+
+
+def _paths(paths):
+    if paths is None:
+        return ()
+    if isinstance(paths, str):
+        return (paths,)
+    return tuple(paths)
+
+
+def _compile_setter(path):
+    """Build a fast setter for 'attr' or 'attr.key.key...' relative to a root object."""
+    attr, *keys = path.split('.')
+    if not keys:
+        def set_attr(root, value):
+            setattr(root, attr, value)
+        return set_attr
+    *parents, last = keys
+
+    def set_item(root, value):
+        container = getattr(root, attr)
+        for key in parents:
+            container = container[key]
+        container[last] = value
+    return set_item
+
+
+def parse_frame(line):
+    """Split a received line into (flag, values); None if it is not a frame."""
+    parts = line.split(';')
+    if len(parts) < 2:
+        return None
+    return int(parts[0]), [float(x) if '.' in x else int(x) for x in parts[1:]]
+
+
+def as_bool(value):
+    """Converter for 0/1 flag values."""
+    return bool(int(value))
+
+
+class FrameSpec:
+    """Decoder, storage targets and encoder for one UART flag."""
+
+    def __init__(self, flag, name, fields=(), handler=None, min_values=None):
+        self.flag = flag
+        self.name = name
+        self.fields = tuple(f if isinstance(f, Field) else Field(f) for f in fields)
+        self.min_values = len(self.fields) if min_values is None else min_values
+        self.handler = handler
+        self._decoders = tuple((f.name, f.scale, f.convert) for f in self.fields)
+        setters = []
+        for index, f in enumerate(self.fields):
+            for path in _paths(f.target):
+                setters.append((index, f.name, False, _compile_setter(path)))
+            for path in _paths(f.raw_target):
+                setters.append((index, f.name, True, _compile_setter(path)))
+        self._setters = tuple(setters)
+
+    def decode(self, values):
+        """Return {field name: scaled value} for the received raw values."""
+        if len(values) < self.min_values:
+            raise ValueError(f"flag {self.flag} ({self.name}) expects {self.min_values} values, got {len(values)}")
+        decoded = {}
+        for (name, scale, convert), raw in zip(self._decoders, values):
+            value = raw / scale if scale != 1 else raw
+            if convert is not None:
+                value = convert(value)
+            decoded[name] = value
+        return decoded
+
+    def apply(self, target, values, decoded):
+        """Store decoded values on target and run the flag's handler, if any."""
+        for index, name, raw, setter in self._setters:
+            if name in decoded:
+                setter(target, values[index] if raw else decoded[name])
+        if self.handler is not None:
+            self.handler(self.flag, decoded)
+
+    def encode(self, data):
+        """Build the "flag;v1;v2;..." line for data, a mapping of field name to value."""
+        parts = [str(self.flag)]
+        for f in self.fields:
+            raw = int(round(data[f.name] * f.scale))
+            parts.append(f"{raw:0{f.width}d}" if f.width else str(raw))
+        return ';'.join(parts)
+
+
+class FrameRegistry:
+    """Flag -> FrameSpec table with O(1) dispatch."""
+
+    def __init__(self):
+        self._specs = {}
+
+    def register(self, flags, name, fields=(), handler=None, min_values=None):
+        """Add a spec for one flag or an iterable of flags sharing a layout."""
+        if isinstance(flags, int):
+            flags = (flags,)
+        for flag in flags:
+            self._specs[flag] = FrameSpec(flag, name, fields, handler, min_values)
+
+    def on(self, flags, name, fields=(), min_values=None):
+        """Decorator form of register() for flags with a handler function(flag, decoded)."""
+        def decorator(handler):
+            self.register(flags, name, fields, handler, min_values)
+            return handler
+        return decorator
+
+    def get(self, flag):
+        return self._specs.get(flag)
+
+    def __contains__(self, flag):
+        return flag in self._specs
+
+    def dispatch(self, target, flag, values):
+        """Decode a frame and apply it to target; returns the decoded fields, or None for unknown flags."""
+        spec = self._specs.get(flag)
+        if spec is None:
+            return None
+        decoded = spec.decode(values)
+        spec.apply(target, values, decoded)
+        return decoded
+
+    def encode(self, flag, data):
+        return self._specs[flag].encode(data)
@@ -0,0 +1,272 @@
+"""Concurrent HTTP serving for the dashboard endpoints.
+
+PooledHTTPServer hands every accepted connection to a bounded pool of
+worker threads, and KeepAliveRequestHandler lets the existing
+send_response / send_header / end_headers / wfile.write handler code speak
+HTTP/1.1 keep-alive without having to compute Content-Length itself.
+send_body() and send_json() write a whole response with a prebuilt
+Content-type/CORS header block.
+"""
+import io
+import json
+import logging
+import queue
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from snapshots import etag_matches
+
+logger = logging.getLogger(__name__)
+
+_header_blocks = {}
+
+
+def _header_block(content_type):
+    """Prebuilt Content-type and CORS header lines shared by most responses."""
+    block = _header_blocks.get(content_type)
+    if block is None:
+        block = _header_blocks[content_type] = (
+            f"Content-type: {content_type}\r\nAccess-Control-Allow-Origin: *\r\n".encode('latin-1'))
+    return block
+
+
+class KeepAliveRequestHandler(BaseHTTPRequestHandler):
+    """Request handler base that keeps client connections open between requests.
+
+    Each response is buffered until the handler method returns and then sent
+    in one write with a Content-Length header, so subclasses do not need to
+    change the way they build responses.
+    """
+    protocol_version = 'HTTP/1.1'
+    # Idle keep-alive connections give their worker back after this many seconds
+    timeout = 5
+    # (second, formatted Date header) shared by all handlers
+    _date = (None, None)
+
+    def setup(self):
+        super().setup()
+        self._socket_wfile = self.wfile
+
+    def handle_one_request(self):
+        self._response_head = None
+        self._response_code = None
+        self._has_content_length = False
+        buffer = io.BytesIO()
+        self.wfile = buffer
+        try:
+            super().handle_one_request()
+        finally:
+            self.wfile = self._socket_wfile
+        self._send_buffered_response(buffer.getvalue())
+
+    def send_response_only(self, code, message=None):
+        self._response_code = code
+        super().send_response_only(code, message)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'content-length':
+            self._has_content_length = True
+        super().send_header(keyword, value)
+
+    def end_headers(self):
+        if self.wfile is self._socket_wfile:
+            super().end_headers()
+            return
+        # Hold the header block back until the body length is known
+        self._response_head = b"".join(getattr(self, '_headers_buffer', []))
+        self._headers_buffer = []
+
+    def log_error(self, format, *args):
+        # An idle keep-alive connection timing out is routine, not an error
+        if format.startswith("Request timed out"):
+            return
+        super().log_error(format, *args)
+
+    def _send_buffered_response(self, body):
+        if self._response_head is None:
+            return
+        head = self._response_head
+        if not self._has_content_length and self._response_code not in (204, 304):
+            head += b"Content-Length: %d\r\n" % len(body)
+        try:
+            self.wfile.write(head + b"\r\n" + body)
+            self.wfile.flush()
+        except OSError:
+            # Client went away mid-response
+            self.close_connection = True
+
+    def date_time_string(self, timestamp=None):
+        # Format the Date header once per second rather than once per response
+        if timestamp is not None:
+            return super().date_time_string(timestamp)
+        now = int(time.time())
+        cached = KeepAliveRequestHandler._date
+        if cached[0] != now:
+            cached = KeepAliveRequestHandler._date = (now, super().date_time_string(now))
+        return cached[1]
+
+    def send_body(self, body, code=200, content_type='application/json', headers=()):
+        """Send a complete response: status, the shared header block, extra headers and body."""
+        self.send_response(code)
+        self._headers_buffer.append(_header_block(content_type))
+        for keyword, value in headers:
+            self.send_header(keyword, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, data, code=200, headers=()):
+        """Send data serialized as JSON."""
+        self.send_body(json.dumps(data).encode(), code, 'application/json', headers)
+
+    def send_json_snapshot(self, snapshots, name, key, build):
+        """Answer from a SnapshotCache entry, with 304 if the client's copy is current."""
+        etag, body = snapshots.get(name, key, build)
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Access-Control-Expose-Headers', 'ETag')
+            self.end_headers()
+            return
+        self.send_body(body, headers=(('Access-Control-Expose-Headers', 'ETag'), ('ETag', etag),
+                                      ('Cache-Control', 'no-cache')))
+
+
+    def start_stream(self, content_type):
+        """Send a 200 head right away and write the rest of the body straight to the socket.
+
+        Used for long-lived responses such as event streams; the connection
+        is closed when the handler returns.
+        """
+        self.wfile = self._socket_wfile
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.flush()
+
+    def stream_on_own_thread(self, content_type, serve):
+        """Send a streaming 200 head, then have serve(wfile) write the body on a thread of its own.
+
+        The server's worker is free again as soon as the handler returns,
+        so long-lived streams can't use up the pool; serve() runs until
+        the stream ends and the connection is closed after it.
+        """
+        self.start_stream(content_type)
+        self.close_connection = True
+        self.detached = serve
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that serves connections on a bounded pool of worker threads.
+
+    At most max_workers connections are served at once and max_pending more
+    wait for a free worker; connections beyond that are answered 503 and
+    closed, so the accept loop never blocks.  Streams started with
+    stream_on_own_thread() get a thread each instead of keeping a worker.
+    """
+    allow_reuse_address = True
+    request_queue_size = 32
+
+    def __init__(self, server_address, handler_class, max_workers=8, max_pending=16,
+                 shutdown_timeout=10.0):
+        super().__init__(server_address, handler_class)
+        self.max_workers = max_workers
+        self.shutdown_timeout = shutdown_timeout
+        self._requests = queue.Queue(maxsize=max_pending)
+        self._streams = set()
+        self._streams_lock = threading.Lock()
+        self._workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f'http-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def process_request(self, request, client_address):
+        try:
+            self._requests.put_nowait((request, client_address))
+        except queue.Full:
+            logger.warning("All HTTP workers busy; refusing connection from %s", client_address[0])
+            self._refuse(request)
+
+    def _refuse(self, request):
+        try:
+            request.settimeout(0)
+            request.sendall(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n"
+                            b"Connection: close\r\nRetry-After: 1\r\n\r\n")
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def finish_request(self, request, client_address):
+        # Returns the handler, so the worker can see whether it detached a stream
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def _worker_loop(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            request, client_address = item
+            serve = None
+            try:
+                handler = self.finish_request(request, client_address)
+                serve = getattr(handler, 'detached', None)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                if serve is None:
+                    self.shutdown_request(request)
+            if serve is not None:
+                thread = threading.Thread(target=self._serve_stream, args=(request, serve),
+                                          name='http-stream', daemon=True)
+                with self._streams_lock:
+                    self._streams.add(thread)
+                thread.start()
+
+    def _serve_stream(self, request, serve):
+        try:
+            with request.makefile('wb') as wfile:
+                serve(wfile)
+        except OSError:
+            pass  # Client went away
+        except Exception:
+            logger.exception("Stream handler failed")
+        finally:
+            self.shutdown_request(request)
+            with self._streams_lock:
+                self._streams.discard(threading.current_thread())
+
+    def server_close(self):
+        """Stop accepting connections and give in-flight requests time to finish.
+
+        Connections still waiting for a worker are closed unanswered.
+        """
+        super().server_close()
+        while True:
+            try:
+                item = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self.shutdown_request(item[0])
+        deadline = time.monotonic() + self.shutdown_timeout
+        for _ in self._workers:
+            try:
+                self._requests.put(None, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        with self._streams_lock:
+            streams = list(self._streams)
+        for thread in self._workers + streams:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+
+def install_shutdown_signals():
+    """Make SIGTERM stop serve_forever() the same way Ctrl-C does."""
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
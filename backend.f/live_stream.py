@@ -0,0 +1,144 @@
+"""Push stream of live sensor state for Server-Sent Events clients.
+
+The UART side calls LiveStream.publish() with the current field values;
+only fields that changed since the last publish are handed to subscribers.
+Each subscriber keeps a single dict of pending changes, so a slow client
+just receives the newest values in fewer, larger events and can never
+stall the publisher.
+"""
+import json
+import threading
+import time
+
+_MISSING = object()
+
+
+class Subscription:
+    """Pending, coalesced changes for one connected client."""
+
+    def __init__(self, initial):
+        self._cond = threading.Condition()
+        self._pending = dict(initial)
+        self.closed = False
+        # Called after every push/close, for waiters that are not threads
+        self.waker = None
+
+    def push(self, changed):
+        """Merge changed fields into the pending set; never blocks on the client."""
+        with self._cond:
+            self._pending.update(changed)
+            self._cond.notify()
+        if self.waker is not None:
+            self.waker()
+
+    def next_changes(self, timeout):
+        """Wait up to timeout seconds for changes and return them (empty on timeout)."""
+        with self._cond:
+            if not self._pending and not self.closed:
+                self._cond.wait(timeout)
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        if self.waker is not None:
+            self.waker()
+
+
+class LiveStream:
+    """Fan-out of changed fields to a bounded number of subscribers."""
+
+    def __init__(self, max_subscribers=4):
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._state = {}
+        self._subscribers = set()
+
+    def publish(self, fields):
+        """Record the current values of fields and notify subscribers of the changed ones."""
+        with self._lock:
+            state = self._state
+            changed = {k: v for k, v in fields.items() if state.get(k, _MISSING) != v}
+            if not changed:
+                return
+            state.update(changed)
+            subscribers = tuple(self._subscribers)
+        for subscription in subscribers:
+            subscription.push(changed)
+
+    def subscribe(self):
+        """Register a client; returns None when max_subscribers are already connected."""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscription = Subscription(self._state)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+        subscription.close()
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def close_all(self):
+        """Disconnect every subscriber, e.g. when the server shuts down."""
+        with self._lock:
+            subscribers = tuple(self._subscribers)
+            self._subscribers.clear()
+        for subscription in subscribers:
+            subscription.close()
+
+    def serve_events(self, wfile, subscription, min_interval=0.1, keepalive=15.0):
+        """Write Server-Sent Events to wfile until the client disconnects.
+
+        At most one event is sent per min_interval; changes arriving in
+        between are merged into the next event.  A comment line is sent
+        every keepalive seconds without changes so proxies keep the
+        connection open and dead clients are noticed.
+        """
+        wfile.write(b"retry: 2000\n\n")
+        wfile.flush()
+        while not subscription.closed:
+            started = time.monotonic()
+            changes = subscription.next_changes(keepalive)
+            if changes:
+                wfile.write(b"data: " + json.dumps(changes).encode() + b"\n\n")
+            else:
+                wfile.write(b": keepalive\n\n")
+            wfile.flush()
+            elapsed = time.monotonic() - started
+            if elapsed < min_interval:
+                time.sleep(min_interval - elapsed)
+
+    async def serve_events_async(self, writer, subscription, min_interval=0.1, keepalive=15.0):
+        """serve_events() for an asyncio StreamWriter, waiting on the event loop instead of a thread."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        subscription.waker = lambda: loop.call_soon_threadsafe(wake.set)
+        writer.write(b"retry: 2000\n\n")
+        await writer.drain()
+        while not subscription.closed:
+            started = loop.time()
+            changes = subscription.next_changes(0)
+            if not changes:
+                try:
+                    await asyncio.wait_for(wake.wait(), keepalive)
+                except asyncio.TimeoutError:
+                    pass
+                wake.clear()
+                changes = subscription.next_changes(0)
+            if changes:
+                writer.write(b"data: " + json.dumps(changes).encode() + b"\n\n")
+            else:
+                writer.write(b": keepalive\n\n")
+            await writer.drain()
+            elapsed = loop.time() - started
+            if elapsed < min_interval:
+                await asyncio.sleep(min_interval - elapsed)
@@ -0,0 +1,76 @@
+"""Logging setup shared by the backend processes.
+
+Log calls only put a record on an in-memory queue; a QueueListener thread
+does the file and console I/O.  Each subsystem logs under "backend.<name>"
+(backend.http, backend.uart, ...) and can have its own level, so disabled
+debug output on the UART and HTTP paths costs one level check per call.
+
+Levels come from the environment unless passed explicitly:
+    BACKEND_LOG_LEVEL=INFO
+    BACKEND_LOG_LEVELS=uart=DEBUG,http=WARNING
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+_listener = None
+
+
+def parse_levels(spec):
+    """Parse "uart=DEBUG,http=WARNING" into {'backend.uart': 'DEBUG', 'backend.http': 'WARNING'}."""
+    levels = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        name, level = (part.strip() for part in item.split('=', 1))
+        if name and level:
+            levels[name if '.' in name else f'backend.{name}'] = level.upper()
+    return levels
+
+
+def configure_logging(log_file=None, level=None, levels=None, filters=(), fmt='%(message)s'):
+    """Route all logging through a background queue to the console and log_file.
+
+    Replaces any handlers already on the root logger (e.g. from
+    logging.basicConfig in an imported module) and returns the listener.
+    """
+    global _listener
+    if level is None:
+        level = os.environ.get('BACKEND_LOG_LEVEL', 'INFO').upper()
+    if levels is None:
+        levels = parse_levels(os.environ.get('BACKEND_LOG_LEVELS', ''))
+
+    formatter = logging.Formatter(fmt)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.insert(0, logging.FileHandler(log_file, mode='w'))  # Clear file on start
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        for log_filter in filters:
+            handler.addFilter(log_filter)
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+    for name, subsystem_level in levels.items():
+        logging.getLogger(name).setLevel(subsystem_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def _flush_on_exit():
+    """Write out whatever is still queued when the process exits."""
+    if _listener is not None:
+        _listener.stop()
@@ -0,0 +1,229 @@
+"""Virtual MCU on a pseudo-terminal, for running the backend without the board.
+
+MCUSimulator opens a pty pair and plays the controller side of the UART
+protocol on the master end: group head status (9/10), main boiler
+temperature (8), service sensors (46/47/48), extraction start/stop (13/14)
+and occasional errors (20), each at its own rate.  Point the backend at
+the slave end:
+
+    python mcu_sim.py --rate status=20 --rate service=1
+    BACKEND_UART_PORT=/dev/pts/5 python ../README.md
+
+Frames the backend sends are read and counted so its writes never block
+on a full pty buffer.  When the backend asks for binary framing (51;1) the
+simulator agrees and sends binary frames from then on, unless it was
+started with binary=False (--ascii-only) like older firmware.
+"""
+import argparse
+import collections
+import os
+import pty
+import random
+import select
+import threading
+import time
+import tty
+
+import binary_frames
+from binary_frames import FRAMING_FLAG, FrameDecoder
+
+# Frames per second for each kind of frame the simulator sends by itself
+DEFAULT_RATES = {
+    'status': 10.0,      # 9 and 10, group head temperature/pressure/flow
+    'boiler': 1.0,       # 8, main boiler temperature
+    'service': 0.5,      # 46, 47, 48
+    'extraction': 0.05,  # 13/14 start, then stop after shot_seconds
+    'error': 0.0,        # 20
+}
+
+
+class MCUSimulator:
+    """Controller end of a pty, sending protocol frames at configurable rates."""
+
+    def __init__(self, rates=None, shot_seconds=25.0, seed=None, binary=True):
+        self.rates = dict(DEFAULT_RATES)
+        if rates:
+            self.rates.update(rates)
+        self.shot_seconds = shot_seconds
+        self.random = random.Random(seed)
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port_name = os.ttyname(self.slave)
+        self._write_lock = threading.Lock()
+        self._running = False
+        self._threads = []
+        self._shot_end = {}
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.received = collections.deque(maxlen=100)  # Latest frames from the backend
+        self.binary_capable = binary
+        self.binary = False
+        self.decoder = FrameDecoder()
+        self._tx_seq = 0
+
+    # --- frames ---
+
+    def send(self, line):
+        """Write one frame to the backend."""
+        self.send_many([line])
+
+    def send_many(self, lines):
+        """Write several frames in one write, as a burst from the MCU would arrive."""
+        with self._write_lock:
+            os.write(self.master, b''.join(self._encode(line) for line in lines))
+            self.frames_sent += len(lines)
+
+    def _encode(self, line):
+        if not self.binary:
+            return (line + '\n').encode()
+        flag, *values = line.split(';')
+        data = binary_frames.encode(int(flag), [int(v) for v in values], self._tx_seq)
+        self._tx_seq = (self._tx_seq + 1) & 0xFF
+        return data
+
+    def status_frame(self, gh, pressure=None):
+        r = self.random
+        if pressure is None:
+            pressure = r.randint(0, 120)
+        return f"{8 + gh};{r.randint(880, 950)};{pressure};{r.randint(0, 6)}"
+
+    def boiler_frame(self):
+        return f"8;{self.random.randint(1150, 1250)}"
+
+    def service_frames(self):
+        r = self.random
+        return [
+            "46;" + ";".join(str(v) for v in (r.randint(2150, 2350), r.randint(0, 120), r.randint(0, 50),
+                                              r.randint(0, 50), r.randint(0, 50), r.randint(1150, 1250),
+                                              r.randint(880, 950))),
+            "47;" + ";".join(str(r.randint(850, 960)) for _ in range(3)) + f";{r.randint(0, 120)}",
+            "48;" + ";".join(str(r.randint(0, 100)) for _ in range(3)),
+        ]
+
+    def error_frame(self):
+        return f"20;{self.random.randint(1, 8)}"
+
+    # --- background loops ---
+
+    def start(self, emit=True):
+        """Start reading the backend's frames and, unless emit is False, sending at self.rates."""
+        self._running = True
+        self._spawn(self._drain_loop, 'mcu-rx')
+        if emit:
+            self.start_emitters()
+        return self
+
+    def start_emitters(self, rates=None):
+        """Start one sending thread per frame kind with a non-zero rate."""
+        if rates is not None:
+            self.rates.update(rates)
+        for kind, rate in self.rates.items():
+            if rate > 0:
+                self._spawn(lambda kind=kind, rate=rate: self._emit_loop(kind, rate), f'mcu-{kind}')
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join(2)
+        self._threads = []
+
+    def close(self):
+        self.stop()
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _emit_loop(self, kind, rate):
+        interval = 1.0 / rate
+        next_at = time.monotonic()
+        while self._running:
+            self._emit(kind)
+            next_at += interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_at = time.monotonic()  # Behind schedule; don't try to catch up in a burst
+
+    def _emit(self, kind):
+        if kind == 'status':
+            self.send_many([self.status_frame(1), self.status_frame(2)])
+        elif kind == 'boiler':
+            self.send(self.boiler_frame())
+        elif kind == 'service':
+            self.send_many(self.service_frames())
+        elif kind == 'error':
+            self.send(self.error_frame())
+        elif kind == 'extraction':
+            now = time.monotonic()
+            for gh in (1, 2):
+                if gh not in self._shot_end:
+                    self.send(f"{12 + gh};1")
+                    self._shot_end[gh] = now + self.shot_seconds
+                    break
+            for gh, end in list(self._shot_end.items()):
+                if end <= now:
+                    self.send(f"{12 + gh};0")
+                    del self._shot_end[gh]
+
+    def _drain_loop(self):
+        while self._running:
+            try:
+                ready, _, _ = select.select([self.master], [], [], 0.2)
+                if not ready:
+                    continue
+                chunk = os.read(self.master, 4096)
+            except OSError:
+                return
+            lines = [item if isinstance(item, str) else ';'.join(map(str, (item[0], *item[1])))
+                     for item in self.decoder.feed(chunk)]
+            self.frames_received += len(lines)
+            self.received.extend(lines)
+            if f"{FRAMING_FLAG};1" in lines and self.binary_capable:
+                # Answer in ASCII, then switch
+                self.send(f"{FRAMING_FLAG};1")
+                self.binary = True
+
+
+def parse_rates(items):
+    rates = {}
+    for item in items or ():
+        kind, _, value = item.partition('=')
+        if kind not in DEFAULT_RATES:
+            raise SystemExit(f"unknown frame kind {kind!r}; choose from {', '.join(DEFAULT_RATES)}")
+        rates[kind] = float(value)
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the espresso machine MCU on a pty")
+    parser.add_argument('--rate', action='append', metavar='KIND=HZ',
+                        help=f"frames per second per kind ({', '.join(DEFAULT_RATES)})")
+    parser.add_argument('--shot-seconds', type=float, default=25.0)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--ascii-only', action='store_true', help="refuse binary framing like older firmware")
+    args = parser.parse_args()
+
+    sim = MCUSimulator(parse_rates(args.rate), args.shot_seconds, args.seed, binary=not args.ascii_only)
+    print(f"MCU simulator on {sim.port_name}")
+    print(f"Run the backend with BACKEND_UART_PORT={sim.port_name}")
+    sim.start()
+    try:
+        while True:
+            time.sleep(5)
+            print(f"sent {sim.frames_sent} frames, received {sim.frames_received}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.close()
+
+
+if __name__ == '__main__':
+    main()
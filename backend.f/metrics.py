@@ -0,0 +1,172 @@
+"""In-process counters and latency histograms, rendered as Prometheus text.
+
+Histograms use fixed power-of-two buckets from 1 us to about 2 minutes,
+so each labelled series costs a constant ~30 integers however many events
+it records, and observing one duration is one integer bit_length() plus
+a few list updates.  Time durations with time.perf_counter_ns():
+
+    started = time.perf_counter_ns()
+    ...
+    request_seconds.observe(time.perf_counter_ns() - started, 'GET', '/getdata')
+
+Each thread records into its own shard of every metric, so recording
+takes no lock and loses no updates; a scrape adds the shards up.  Gauges
+are callbacks evaluated only when /metrics is scraped, which keeps queue
+depths and other derived values off the hot paths entirely.
+"""
+import threading
+
+# Bucket i counts durations below 2**i microseconds; the last one is +Inf
+BUCKETS = 28
+_BOUNDS = [f"{2 ** i / 1e6:g}" for i in range(BUCKETS - 1)] + ["+Inf"]
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=''):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Sharded:
+    """Per-thread {labels: values} maps, written without locks and merged when read."""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+
+    def _new_shard(self):
+        shard = self._local.shard = {}
+        with self._lock:
+            self._shards.append(shard)
+        return shard
+
+    def _merged(self, size):
+        """{labels: element-wise sum of every thread's list of size values}"""
+        with self._lock:
+            shards = list(self._shards)
+        merged = {}
+        for shard in shards:
+            for labels, values in list(shard.items()):
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = list(values)
+                else:
+                    for i in range(size):
+                        total[i] += values[i]
+        return merged
+
+
+class Counter(_Sharded):
+    """Monotonic count per label combination."""
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        value = shard.get(labels)
+        if value is None:
+            value = shard[labels] = [0]
+        value[0] += amount
+
+    def samples(self):
+        for labels, value in self._merged(1).items():
+            yield self.name + _labels(self.labels, labels), value[0]
+
+
+class Histogram(_Sharded):
+    """Latency distribution per label combination, in fixed power-of-two buckets."""
+    kind = 'histogram'
+
+    def observe(self, nanoseconds, *labels):
+        """Record one duration given in nanoseconds."""
+        index = (nanoseconds // 1000).bit_length()
+        if index >= BUCKETS:
+            index = BUCKETS - 1
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        series = shard.get(labels)
+        if series is None:
+            # BUCKETS bucket counts, then the sum in ns
+            series = shard[labels] = [0] * (BUCKETS + 1)
+        series[index] += 1
+        series[BUCKETS] += nanoseconds
+
+    def samples(self):
+        for labels, series in self._merged(BUCKETS + 1).items():
+            total = 0
+            for bound, count in zip(_BOUNDS, series):
+                total += count
+                yield self.name + '_bucket' + _labels(self.labels, labels, f'le="{bound}"'), total
+            yield self.name + '_sum' + _labels(self.labels, labels), series[BUCKETS] / 1e9
+            yield self.name + '_count' + _labels(self.labels, labels), total
+
+
+class Gauge:
+    """Value read from a callback at scrape time; a dict result maps label tuples to values."""
+    kind = 'gauge'
+
+    def __init__(self, name, help, read, labels=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.kind = kind
+        self._read = read
+
+    def samples(self):
+        value = self._read()
+        if value is None:
+            return
+        if isinstance(value, dict):
+            for labels, v in value.items():
+                yield self.name + _labels(self.labels, labels if isinstance(labels, tuple) else (labels,)), v
+        else:
+            yield self.name, value
+
+
+class MetricsRegistry:
+    """All metrics of the process, in registration order."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=()):
+        return self._add(Histogram(name, help, labels))
+
+    def gauge(self, name, help, read, labels=(), kind='gauge'):
+        """Register read() as a gauge, or with kind='counter' as a counter kept elsewhere."""
+        return self._add(Gauge(name, help, read, labels, kind))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name} {value!r}" if isinstance(value, float) else f"{name} {value}"
+                         for name, value in samples)
+        return '\n'.join(lines) + '\n'
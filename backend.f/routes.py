@@ -0,0 +1,73 @@
+"""Method and path route table for the HTTP request handler.
+
+Routes are declared on the handler class, next to the code that serves
+them, with the method and the content type of the response:
+
+    routes = RouteTable()
+
+    class RequestHandler(KeepAliveRequestHandler):
+        @routes.get('/getdata')
+        def get_data(self, state, query):
+            ...
+
+match() finds the route for a request with a single dict lookup, however
+many routes there are, and split_target() separates the query string so
+'/getgauge?gh_id=2' reaches the '/getgauge' route.
+"""
+from urllib.parse import parse_qs
+
+
+class Route:
+    """One endpoint: method, path, the handler function and its response content type."""
+    __slots__ = ('method', 'path', 'handler', 'content_type')
+
+    def __init__(self, method, path, handler, content_type):
+        self.method = method
+        self.path = path
+        self.handler = handler
+        self.content_type = content_type
+
+
+def split_target(target):
+    """Split a request target into (path, {name: [values]})."""
+    path, _, query = target.partition('?')
+    return path, parse_qs(query) if query else {}
+
+
+class RouteTable:
+    """(method, path) -> Route table with O(1) dispatch."""
+
+    def __init__(self):
+        self._routes = {}
+        self._methods = {}  # path -> methods registered for it, for 405 responses
+
+    def add(self, method, path, handler, content_type='application/json'):
+        if (method, path) in self._routes:
+            raise ValueError(f"{method} {path} is already routed")
+        route = self._routes[method, path] = Route(method, path, handler, content_type)
+        self._methods.setdefault(path, []).append(method)
+        return route
+
+    def route(self, method, path, content_type='application/json'):
+        """Decorator registering the decorated function as the handler of method and path."""
+        def register(handler):
+            self.add(method, path, handler, content_type)
+            return handler
+        return register
+
+    def get(self, path, content_type='application/json'):
+        return self.route('GET', path, content_type)
+
+    def post(self, path, content_type='application/json'):
+        return self.route('POST', path, content_type)
+
+    def match(self, method, path):
+        """Route for method and path (without query string); None if there is none."""
+        return self._routes.get((method, path))
+
+    def methods(self, path):
+        """Methods routed for path; empty if the path is unknown."""
+        return self._methods.get(path, [])
+
+    def __iter__(self):
+        return iter(self._routes.values())
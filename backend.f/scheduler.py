@@ -0,0 +1,164 @@
+"""One thread for every delayed action in the backend.
+
+Scheduler keeps pending calls in a heap ordered by due time and runs them
+on a single worker thread, so scheduling is O(log n) and no thread is
+created per event.  A call scheduled with a key replaces the pending call
+with the same key, which is what "restart the 3 second timer" wants.
+Cancelled entries stay in the heap and are skipped when they come due.
+
+Callbacks run one after another on the scheduler thread and should be
+quick; hand anything slow to another worker.  Under the asyncio runtime
+the same heap is served by run_async() on the event loop instead.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger('backend.scheduler')
+
+
+class ScheduledCall:
+    """Handle for one pending call; cancel() stops it from running."""
+    __slots__ = ('due', 'func', 'args', 'key', 'cancelled')
+
+    def __init__(self, due, func, args, key):
+        self.due = due
+        self.func = func
+        self.args = args
+        self.key = key
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    """Heap of delayed calls served by one daemon thread."""
+
+    def __init__(self, name='scheduler', clock=time.monotonic):
+        self.name = name
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._heap = []
+        self._keyed = {}
+        self._seq = itertools.count()
+        self._running = False
+        self._thread = None
+        self._wake = None
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stop the worker; calls still pending are dropped."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def call_later(self, delay, func, *args, key=None):
+        """Run func(*args) after delay seconds; a key replaces the pending call with that key."""
+        call = ScheduledCall(self.clock() + delay, func, args, key)
+        with self._cond:
+            if key is not None:
+                previous = self._keyed.get(key)
+                if previous is not None:
+                    previous.cancel()
+                self._keyed[key] = call
+            heapq.heappush(self._heap, (call.due, next(self._seq), call))
+            # Only wake the worker if this call is now the first one due
+            if self._heap[0][2] is call:
+                self._cond.notify()
+                if self._wake is not None:
+                    self._wake()
+        return call
+
+    def cancel(self, key):
+        """Cancel the pending call with key; returns True if there was one."""
+        with self._cond:
+            call = self._keyed.pop(key, None)
+        if call is None:
+            return False
+        call.cancel()
+        return True
+
+    def pending(self, key=None):
+        """Number of calls waiting to run, or whether the call with key is still pending."""
+        with self._cond:
+            if key is not None:
+                call = self._keyed.get(key)
+                return call is not None and not call.cancelled
+            return sum(1 for _, _, call in self._heap if not call.cancelled)
+
+    def _next_due(self):
+        """Pop the first call that is due; otherwise return (None, seconds until one is, or None)."""
+        # Drop cancelled calls from the front of the heap
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None, None
+        delay = self._heap[0][0] - self.clock()
+        if delay > 0:
+            return None, delay
+        _, _, call = heapq.heappop(self._heap)
+        if call.key is not None and self._keyed.get(call.key) is call:
+            del self._keyed[call.key]
+        return call, 0
+
+    def run_due(self):
+        """Run every call due by clock() on the calling thread; for a stopped scheduler on a virtual clock."""
+        while True:
+            with self._cond:
+                call, _ = self._next_due()
+            if call is None:
+                return
+            self._call(call)
+
+    def _call(self, call):
+        try:
+            call.func(*call.args)
+        except Exception:
+            logger.exception("Scheduled call %r failed", call.func)
+
+    async def run_async(self):
+        """Serve the calls from the running event loop until cancelled; use instead of start()."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        with self._cond:
+            self._wake = lambda: loop.call_soon_threadsafe(wake.set)
+        try:
+            while True:
+                wake.clear()
+                with self._cond:
+                    call, delay = self._next_due()
+                if call is not None:
+                    self._call(call)
+                    continue
+                try:
+                    await asyncio.wait_for(wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._wake = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        return
+                    call, delay = self._next_due()
+                    if call is not None:
+                        break
+                    self._cond.wait(delay)
+            self._call(call)
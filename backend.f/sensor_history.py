@@ -0,0 +1,137 @@
+"""In-memory time series of recent sensor readings.
+
+Every sensor gets a fixed-size ring of (timestamp, value) samples held in
+two array('d') buffers, so memory stays bounded however long the machine
+runs.  query() returns min/max/mean per time bucket, which is what the
+dashboard charts need without polling /getdata for every point.
+"""
+import array
+import bisect
+import threading
+import time
+
+
+class SensorRing:
+    """Fixed-capacity ring buffer of timestamped samples for one sensor."""
+    __slots__ = ('capacity', 'times', 'values', '_next', 'count')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array.array('d', bytes(8 * capacity))
+        self.values = array.array('d', bytes(8 * capacity))
+        self._next = 0
+        self.count = 0
+
+    def append(self, timestamp, value):
+        if self.count:
+            # Keep timestamps ordered for bisect even if the wall clock steps back
+            timestamp = max(timestamp, self.times[self._next - 1])
+        self.times[self._next] = timestamp
+        self.values[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _segments(self):
+        """(lo, hi) index ranges of the stored samples, oldest first."""
+        if self.count < self.capacity:
+            return ((0, self.count),)
+        return ((self._next, self.capacity), (0, self._next))
+
+    def window(self, start, end):
+        """Copy of the (times, values) samples with start <= t <= end."""
+        times = array.array('d')
+        values = array.array('d')
+        for lo, hi in self._segments():
+            i = bisect.bisect_left(self.times, start, lo, hi)
+            j = bisect.bisect_right(self.times, end, i, hi)
+            times += self.times[i:j]
+            values += self.values[i:j]
+        return times, values
+
+    def latest(self):
+        if not self.count:
+            return None
+        return self.times[self._next - 1], self.values[self._next - 1]
+
+
+def downsample(times, values, start, end, buckets):
+    """Reduce samples to per-bucket columns; buckets without samples are left out."""
+    width = (end - start) / buckets if end > start else 1.0
+    columns = {'t': [], 'min': [], 'max': [], 'mean': [], 'count': []}
+    current = None
+    for t, v in zip(times, values):
+        index = min(int((t - start) / width), buckets - 1)
+        if index != current:
+            if current is not None:
+                _close_bucket(columns, start + current * width, lo, hi, total, n)
+            current, lo, hi, total, n = index, v, v, 0.0, 0
+        lo = v if v < lo else lo
+        hi = v if v > hi else hi
+        total += v
+        n += 1
+    if current is not None:
+        _close_bucket(columns, start + current * width, lo, hi, total, n)
+    return columns
+
+
+def _close_bucket(columns, t, lo, hi, total, n):
+    columns['t'].append(round(t, 3))
+    columns['min'].append(lo)
+    columns['max'].append(hi)
+    columns['mean'].append(round(total / n, 3))
+    columns['count'].append(n)
+
+
+class SensorHistory:
+    """Named SensorRings, created on first sample."""
+
+    def __init__(self, capacity=3600, clock=time.time):
+        self.capacity = capacity
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._rings = {}
+
+    def record(self, prefix, fields, timestamp=None):
+        """Append every numeric value of fields as series "<prefix>.<field name>"."""
+        if timestamp is None:
+            timestamp = self.clock()
+        with self._lock:
+            for name, value in fields.items():
+                key = f"{prefix}.{name}"
+                ring = self._rings.get(key)
+                if ring is None:
+                    ring = self._rings[key] = SensorRing(self.capacity)
+                ring.append(timestamp, float(value))
+
+    def names(self):
+        with self._lock:
+            return sorted(self._rings)
+
+    def query(self, names=None, start=None, end=None, buckets=60):
+        """Downsampled min/max/mean columns for each series between start and end.
+
+        end defaults to now and start to 60 seconds before end; unknown
+        names raise KeyError.
+        """
+        if end is None:
+            end = self.clock()
+        if start is None:
+            start = end - 60
+        if buckets < 1 or start > end:
+            raise ValueError("need buckets >= 1 and start <= end")
+        with self._lock:
+            if names is None:
+                names = sorted(self._rings)
+            missing = [name for name in names if name not in self._rings]
+            if missing:
+                raise KeyError(', '.join(missing))
+            windows = {name: self._rings[name].window(start, end) for name in names}
+        series = {name: downsample(times, values, start, end, buckets)
+                  for name, (times, values) in windows.items()}
+        return {
+            "start": start,
+            "end": end,
+            "bucket_seconds": (end - start) / buckets,
+            "series": series,
+        }
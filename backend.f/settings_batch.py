@@ -0,0 +1,164 @@
+"""Validation of the whole-settings document accepted by POST /saveconfig.
+
+The document carries any subset of these sections, each with any subset
+of its fields:
+
+    gh1, gh2   temperature, extraction_volume, extraction_time, purge,
+               pre_infusion ({enabled, time} or seconds), backflush (bool or {enabled})
+    main       temperature
+    pressure   pressure, max_pressure, min_pressure
+    system     eco_mode ('off' | 'eco' | 'sleep'), barista_light, cup_warmer
+               (percent or {enabled, percentage}), sleep_time ({month, day, hour, minute})
+
+validate_settings() checks the whole document before anything is applied
+and returns it normalized to the shapes Config stores, so the caller can
+compare it field by field with the current settings.
+"""
+
+MODES = {'off': 0, 'eco': 1, 'sleep': 2}
+
+
+class SettingsError(ValueError):
+    """The settings document is invalid; errors lists every problem found."""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _number(value, path, errors, minimum=None, maximum=None):
+    if not _is_number(value):
+        errors.append(f"{path}: expected a number")
+        return None
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        errors.append(f"{path}: {value} is outside {minimum}..{maximum}")
+        return None
+    return value
+
+
+def _integer(value, path, errors, minimum=0, maximum=None):
+    value = _number(value, path, errors, minimum, maximum)
+    return None if value is None else int(value)
+
+
+def _flag(value, path, errors):
+    if isinstance(value, dict):
+        value = value.get('enabled', False)
+    if not isinstance(value, (bool, int)):
+        errors.append(f"{path}: expected true or false")
+        return None
+    return bool(value)
+
+
+def _pre_infusion(value, path, errors):
+    if _is_number(value):
+        seconds = _number(value, path, errors, 0)
+        return None if seconds is None else {'enabled': seconds > 0, 'time': seconds}
+    if not isinstance(value, dict):
+        errors.append(f"{path}: expected seconds or {{enabled, time}}")
+        return None
+    enabled = _flag(value.get('enabled', False), f"{path}.enabled", errors)
+    seconds = _number(value.get('time', 0), f"{path}.time", errors, 0)
+    if enabled is None or seconds is None:
+        return None
+    return {'enabled': enabled, 'time': seconds}
+
+
+def _percentage(value, path, errors):
+    if isinstance(value, dict):
+        enabled = _flag(value.get('enabled', False), f"{path}.enabled", errors)
+        percent = _integer(value.get('percentage', 0), f"{path}.percentage", errors, 0, 100)
+        if enabled is None or percent is None:
+            return None
+        return percent if enabled else 0
+    return _integer(value, path, errors, 0, 100)
+
+
+def _mode(value, path, errors):
+    if value not in MODES:
+        errors.append(f"{path}: expected one of {', '.join(MODES)}")
+        return None
+    return MODES[value]
+
+
+def _sleep_time(value, path, errors):
+    if not isinstance(value, dict):
+        errors.append(f"{path}: expected {{month, day, hour, minute}}")
+        return None
+    limits = {'month': (1, 12), 'day': (1, 31), 'hour': (0, 23), 'minute': (0, 59)}
+    result = {}
+    for key, (low, high) in limits.items():
+        if key not in value:
+            errors.append(f"{path}.{key}: missing")
+            continue
+        result[key] = _integer(value[key], f"{path}.{key}", errors, low, high)
+    for key in value.keys() - limits.keys():
+        errors.append(f"{path}.{key}: unknown field")
+    return None if None in result.values() or len(result) < len(limits) else result
+
+
+def _gh_temperature(value, path, errors):
+    value = _number(value, path, errors, 0, 150)
+    return None if value is None else float(value)
+
+
+def _float(value, path, errors):
+    value = _number(value, path, errors)
+    return None if value is None else float(value)
+
+
+_GH_FIELDS = {
+    'temperature': _gh_temperature,
+    'extraction_volume': _integer,
+    'extraction_time': _integer,
+    'purge': _integer,
+    'pre_infusion': _pre_infusion,
+    'backflush': _flag,
+}
+
+# section -> {field: validator(value, path, errors) returning the normalized value or None}
+SECTIONS = {
+    'gh1': _GH_FIELDS,
+    'gh2': _GH_FIELDS,
+    'main': {'temperature': _float},
+    'pressure': {'pressure': _float, 'max_pressure': _float, 'min_pressure': _float},
+    'system': {'eco_mode': _mode, 'barista_light': _percentage, 'cup_warmer': _percentage,
+               'sleep_time': _sleep_time},
+}
+
+
+def validate_settings(document):
+    """Return {section: {field: normalized value}}; raises SettingsError listing every problem."""
+    if not isinstance(document, dict):
+        raise SettingsError(["expected a JSON object of settings sections"])
+    errors = []
+    settings = {}
+    for section, fields in document.items():
+        validators = SECTIONS.get(section)
+        if validators is None:
+            errors.append(f"{section}: unknown section")
+            continue
+        if not isinstance(fields, dict):
+            errors.append(f"{section}: expected an object")
+            continue
+        normalized = {}
+        for name, value in fields.items():
+            validator = validators.get(name)
+            if validator is None:
+                errors.append(f"{section}.{name}: unknown field")
+                continue
+            before = len(errors)
+            result = validator(value, f"{section}.{name}", errors)
+            if len(errors) == before:
+                normalized[name] = result
+        settings[section] = normalized
+    pressure = settings.get('pressure', {})
+    if pressure.get('min_pressure', 0) > pressure.get('max_pressure', float('inf')):
+        errors.append("pressure: min_pressure is above max_pressure")
+    if errors:
+        raise SettingsError(errors)
+    return settings
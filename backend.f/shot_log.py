@@ -0,0 +1,360 @@
+"""Per-shot extraction recording in compact append-only binary files.
+
+A shot is the run of group head status samples (pressure, flow,
+temperature) between an extraction start and stop frame.  Finished shots
+are appended to two files in the log directory:
+
+    samples.dat   one 16-byte record per sample: offset from shot start (s),
+                  pressure, flow, temperature (little-endian float32)
+    index.dat     one 48-byte record per shot: id, group head, start and end
+                  time, position and number of its samples, peak and mean
+                  pressure, mean flow
+
+Both files are only ever appended to and are read through mmap, so
+queries bisect the index by start time and touch only the records they
+return instead of loading the whole history.
+
+finish() only hands the shot to a writer thread once start_writer() has
+been called, so the UART thread and scheduler never wait for the disk; a
+finished shot shows up in queries once it has been written.
+"""
+import bisect
+import collections
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+logger = logging.getLogger('backend.shots')
+
+SAMPLE = struct.Struct('<ffff')
+INDEX = struct.Struct('<IB3xddQIfff')
+_START_OFFSET = 8  # offset of the start time within an INDEX record
+
+
+class ShotRecord:
+    """Summary of one recorded shot, as stored in the index."""
+    __slots__ = ('id', 'gh', 'start', 'end', 'first_sample', 'sample_count',
+                 'max_pressure', 'mean_pressure', 'mean_flow')
+
+    def __init__(self, id, gh, start, end, first_sample, sample_count,
+                 max_pressure, mean_pressure, mean_flow):
+        self.id = id
+        self.gh = gh
+        self.start = start
+        self.end = end
+        self.first_sample = first_sample
+        self.sample_count = sample_count
+        self.max_pressure = max_pressure
+        self.mean_pressure = mean_pressure
+        self.mean_flow = mean_flow
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "gh": self.gh,
+            "start": self.start,
+            "end": self.end,
+            "duration": round(self.duration, 2),
+            "sample_count": self.sample_count,
+            "max_pressure": round(self.max_pressure, 2),
+            "mean_pressure": round(self.mean_pressure, 2),
+            "mean_flow": round(self.mean_flow, 2),
+        }
+
+
+class _StartTimes:
+    """Sequence view of the index's start times, for bisect."""
+
+    def __init__(self, view, count):
+        self._view = view
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        return struct.unpack_from('<d', self._view, i * INDEX.size + _START_OFFSET)[0]
+
+
+class ShotLog:
+    """Append-only store of finished shots plus the shots currently in progress."""
+
+    def __init__(self, directory, max_samples=6000, clock=time.time, monotonic=time.monotonic):
+        self.directory = directory
+        self.max_samples = max_samples
+        self.clock = clock              # Wall-clock start times
+        self.monotonic = monotonic      # Sample offsets and durations
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._samples_path = os.path.join(directory, 'samples.dat')
+        self._index_path = os.path.join(directory, 'index.dat')
+        self._samples = open(self._samples_path, 'ab')
+        self._index = open(self._index_path, 'ab')
+        # A crash mid-append can leave a partial record at the end; drop it
+        self._sample_count = self._truncate_partial(self._samples, SAMPLE.size)
+        self._shot_count = self._truncate_partial(self._index, INDEX.size)
+        self._last_start = self._read_last_start()
+        self._next_id = self._shot_count + 1
+        self._next_sample = self._sample_count
+        self._active = {}
+        self._cond = threading.Condition()
+        self._jobs = collections.deque()    # (func, args) for the writer thread
+        self._busy = False
+        self._running = False
+        self._thread = None
+
+    def _read_last_start(self):
+        index = self._map(self._index_path, INDEX.size, self._shot_count)
+        if index is None:
+            return None
+        with index:
+            return _StartTimes(index, self._shot_count)[self._shot_count - 1]
+
+    @staticmethod
+    def _truncate_partial(f, record_size):
+        size = os.fstat(f.fileno()).st_size
+        count = size // record_size
+        if size != count * record_size:
+            f.truncate(count * record_size)
+        return count
+
+    def start_writer(self, name='shot-writer'):
+        """Write finished shots on a background thread from now on."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def after_writes(self, func, *args):
+        """Run func(*args) on the writer thread once the shots finished so far are written.
+
+        Runs it right away when there is no writer thread.
+        """
+        with self._cond:
+            if self._running:
+                self._jobs.append((func, args))
+                self._cond.notify_all()
+                return
+        self._call(func, args)
+
+    def flush(self, timeout=None):
+        """Wait until the finished shots are written and queued calls have run; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._jobs and not self._busy, timeout)
+
+    def close(self, timeout=5.0):
+        self.flush(timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._lock:
+            self._samples.close()
+            self._index.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._jobs or not self._running)
+                if not self._jobs:
+                    return
+                func, args = self._jobs.popleft()
+                self._busy = True
+            self._call(func, args)
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    @staticmethod
+    def _call(func, args):
+        try:
+            func(*args)
+        except Exception:
+            logger.exception("Shot log job %r failed", func)
+
+    # --- recording (UART reader thread) ---
+
+    def start(self, gh):
+        """Begin recording a shot on group head gh, discarding an unfinished one."""
+        self._active[gh] = (self.clock(), self.monotonic(), [])
+
+    def sample(self, gh, pressure, flow, temperature):
+        """Add a status sample to the shot in progress on gh, if any."""
+        shot = self._active.get(gh)
+        if shot is None or len(shot[2]) >= self.max_samples:
+            return
+        shot[2].append((self.monotonic() - shot[1], pressure, flow, temperature))
+
+    def finish(self, gh):
+        """Write the shot in progress on gh to disk (on the writer thread, if started).
+
+        Returns (ShotRecord, samples), samples being the shot's
+        (offset, pressure, flow, temperature) tuples still in memory, or
+        (None, None) if no shot was being recorded on gh.
+        """
+        shot = self._active.pop(gh, None)
+        if shot is None:
+            return None, None
+        start, started, samples = shot
+        duration = self.monotonic() - started
+        pressures = [s[1] for s in samples]
+        n = len(samples)
+        with self._lock:
+            # Keep start times ordered for bisect even if the wall clock stepped
+            # back, or a shot on the other group head started later and finished first
+            if self._last_start is not None:
+                start = max(start, self._last_start)
+            end = start + duration
+            record = ShotRecord(self._next_id, gh, start, end, self._next_sample, n,
+                                max(pressures, default=0.0),
+                                sum(pressures) / n if n else 0.0,
+                                sum(s[2] for s in samples) / n if n else 0.0)
+            self._next_id += 1
+            self._next_sample += n
+            self._last_start = start
+        self.after_writes(self._append, record, samples)
+        return record, samples
+
+    def _append(self, record, samples):
+        with self._lock:
+            # Positions follow what is on disk, in case an earlier append failed
+            record.id = self._shot_count + 1
+            record.first_sample = self._sample_count
+            try:
+                # Samples first, so an index record never points past the end of samples.dat
+                self._samples.write(b''.join(SAMPLE.pack(*s) for s in samples))
+                self._samples.flush()
+                self._index.write(INDEX.pack(record.id, record.gh, record.start, record.end,
+                                             record.first_sample, record.sample_count,
+                                             record.max_pressure, record.mean_pressure, record.mean_flow))
+                self._index.flush()
+            except (OSError, ValueError) as e:  # ValueError: still closed after a failed reopen
+                logger.error("Could not write GH%s shot %s: %s", record.gh, record.id, e)
+                self._samples = self._reopen(self._samples, self._samples_path, self._sample_count * SAMPLE.size)
+                self._index = self._reopen(self._index, self._index_path, self._shot_count * INDEX.size)
+                self._next_id -= 1
+                self._next_sample -= record.sample_count
+                return
+            self._sample_count += record.sample_count
+            self._shot_count += 1
+
+    @staticmethod
+    def _reopen(f, path, length):
+        """f reopened for appending after its last complete record, dropping a partial write."""
+        try:
+            f.close()
+        except OSError:
+            pass  # The unwritten rest is discarded with the buffer
+        try:
+            f = open(path, 'ab')
+            f.truncate(length)
+        except OSError:
+            pass
+        return f
+
+    def recording(self, gh):
+        return gh in self._active
+
+    # --- queries (HTTP threads) ---
+
+    def _map(self, path, record_size, count):
+        if not count:
+            return None
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), count * record_size, access=mmap.ACCESS_READ)
+
+    def _range(self, index, count, start, end):
+        """(lo, hi) positions of the shots that started between start and end."""
+        starts = _StartTimes(index, count)
+        lo = 0 if start is None else bisect.bisect_left(starts, start)
+        hi = count if end is None else bisect.bisect_right(starts, end, lo)
+        return lo, hi
+
+    def shots(self, start=None, end=None, gh=None, limit=None):
+        """ShotRecords that started between start and end, oldest first.
+
+        With limit, only the newest limit of them: the index is walked
+        back from the end of the range and only those records are read.
+        """
+        count = self._shot_count
+        index = self._map(self._index_path, INDEX.size, count)
+        if index is None:
+            return []
+        records = []
+        with index:
+            lo, hi = self._range(index, count, start, end)
+            for i in range(hi - 1, lo - 1, -1):
+                if limit is not None and len(records) >= limit:
+                    break
+                if gh is not None and index[i * INDEX.size + 4] != gh:
+                    continue
+                records.append(ShotRecord(*INDEX.unpack_from(index, i * INDEX.size)))
+        records.reverse()
+        return records
+
+    def get(self, shot_id):
+        """ShotRecord for shot_id (ids count up from 1), or None."""
+        if not 1 <= shot_id <= self._shot_count:
+            return None
+        index = self._map(self._index_path, INDEX.size, shot_id)
+        with index:
+            return ShotRecord(*INDEX.unpack_from(index, (shot_id - 1) * INDEX.size))
+
+    def samples(self, record):
+        """Columns of offset, pressure, flow and temperature for one shot."""
+        columns = {"t": [], "pressure": [], "flow": [], "temperature": []}
+        data = self._map(self._samples_path, SAMPLE.size, record.first_sample + record.sample_count)
+        if data is None:
+            return columns
+        with data:
+            begin = record.first_sample * SAMPLE.size
+            view = memoryview(data)[begin:begin + record.sample_count * SAMPLE.size]
+            for t, pressure, flow, temperature in SAMPLE.iter_unpack(view):
+                columns["t"].append(round(t, 3))
+                columns["pressure"].append(round(pressure, 2))
+                columns["flow"].append(round(flow, 2))
+                columns["temperature"].append(round(temperature, 2))
+            view.release()
+        return columns
+
+    def summary(self, start=None, end=None, gh=None):
+        """Shift-report totals of the shots that started between start and end.
+
+        Reads the index records in the range one at a time, so memory use
+        does not grow with the number of shots.
+        """
+        count = self._shot_count
+        index = self._map(self._index_path, INDEX.size, count)
+        if index is None:
+            return {"count": 0}
+        n = 0
+        duration = max_pressure = flow = 0.0
+        with index:
+            lo, hi = self._range(index, count, start, end)
+            view = memoryview(index)[lo * INDEX.size:hi * INDEX.size]
+            for _, shot_gh, shot_start, shot_end, _, _, shot_max, _, shot_flow in INDEX.iter_unpack(view):
+                if gh is not None and shot_gh != gh:
+                    continue
+                n += 1
+                duration += shot_end - shot_start
+                max_pressure += shot_max
+                flow += shot_flow
+            view.release()
+        if not n:
+            return {"count": 0}
+        return {
+            "count": n,
+            "mean_duration": round(duration / n, 2),
+            "mean_max_pressure": round(max_pressure / n, 2),
+            "mean_flow": round(flow / n, 2),
+        }
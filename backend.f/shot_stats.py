@@ -0,0 +1,182 @@
+"""Per-shot extraction statistics, computed online from the status frames.
+
+Every flag 9/10 status sample of a running shot updates a fixed set of
+running values, so a shot costs the same few numbers of memory however
+long it runs:
+
+    duration            start to stop frame (s)
+    volume              flow integrated over the shot (trapezoid rule
+                        between samples, flow units x seconds)
+    peak_pressure       and time_to_peak, seconds after the start
+    mean_pressure       with pressure_stddev (Welford's algorithm) and
+    pressure_cv         stddev / mean, the pressure stability
+    mean_flow, mean_temperature
+
+When the shot stops, refine() can add the pressure plateau (from the first
+sample at 90% of the peak to the end) from the shot's recorded samples;
+add_plateau() does that after the fact, off the UART thread.
+It uses NumPy when it is installed and the same arithmetic in Python
+otherwise.
+"""
+import math
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:  # Optional; refine() falls back to plain Python
+    numpy = None
+
+PLATEAU_FRACTION = 0.9
+
+
+class ShotAccumulator:
+    """Running statistics of one shot in progress."""
+    __slots__ = ('start', 'started', 'samples', 'last_t', 'last_flow', 'volume',
+                 'peak', 'peak_t', 'mean', 'm2', 'flow_sum', 'temperature_sum')
+
+    def __init__(self, start, started):
+        self.start = start          # Wall-clock start time
+        self.started = started      # ShotStats.monotonic() at the start
+        self.samples = 0
+        self.last_t = None
+        self.last_flow = 0.0
+        self.volume = 0.0
+        self.peak = 0.0
+        self.peak_t = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.flow_sum = 0.0
+        self.temperature_sum = 0.0
+
+    def add(self, t, pressure, flow, temperature):
+        """Add the sample taken t seconds after the start."""
+        if self.last_t is not None:
+            self.volume += (self.last_flow + flow) / 2 * (t - self.last_t)
+        self.last_t = t
+        self.last_flow = flow
+        self.samples += 1
+        delta = pressure - self.mean
+        self.mean += delta / self.samples
+        self.m2 += delta * (pressure - self.mean)
+        if pressure > self.peak or self.samples == 1:
+            self.peak = pressure
+            self.peak_t = t
+        self.flow_sum += flow
+        self.temperature_sum += temperature
+
+    def summary(self, duration):
+        n = self.samples
+        stddev = math.sqrt(self.m2 / n) if n else 0.0
+        return {
+            "start": self.start,
+            "duration": round(duration, 2),
+            "samples": n,
+            "volume": round(self.volume, 1),
+            "peak_pressure": round(self.peak, 2),
+            "time_to_peak": round(self.peak_t, 2),
+            "mean_pressure": round(self.mean, 2),
+            "pressure_stddev": round(stddev, 3),
+            "pressure_cv": round(stddev / self.mean, 4) if self.mean else None,
+            "mean_flow": round(self.flow_sum / n, 2) if n else 0.0,
+            "mean_temperature": round(self.temperature_sum / n, 2) if n else 0.0,
+        }
+
+
+def refine(t, pressure, fraction=PLATEAU_FRACTION):
+    """Plateau statistics from a finished shot's sample offsets and pressures."""
+    if not pressure:
+        return {}
+    if numpy is not None:
+        values = numpy.asarray(pressure, dtype=float)
+        first = int(numpy.argmax(values >= fraction * values.max()))
+        plateau = values[first:]
+        mean, stddev = float(plateau.mean()), float(plateau.std())
+    else:
+        peak = max(pressure)
+        first = next(i for i, p in enumerate(pressure) if p >= fraction * peak)
+        plateau = pressure[first:]
+        mean = sum(plateau) / len(plateau)
+        stddev = math.sqrt(sum((p - mean) ** 2 for p in plateau) / len(plateau))
+    return {
+        "plateau_start": round(t[first], 2),
+        "plateau_mean_pressure": round(mean, 2),
+        "plateau_pressure_stddev": round(stddev, 3),
+    }
+
+
+class ShotStats:
+    """Live statistics of running shots and the summary of the last shot, per group head.
+
+    start/sample/finish are called from the UART thread; snapshot() from
+    HTTP threads.  version changes whenever anything snapshot() returns does.
+    """
+
+    def __init__(self, group_heads=(1, 2), clock=time.time, monotonic=time.monotonic):
+        self.clock = clock              # Wall-clock start times
+        self.monotonic = monotonic      # Sample offsets and durations
+        self._lock = threading.Lock()
+        self._active = {}
+        self._last = {gh: None for gh in group_heads}
+        self.version = 0
+
+    def start(self, gh):
+        """Begin a shot on gh, discarding an unfinished one."""
+        with self._lock:
+            self._active[gh] = ShotAccumulator(self.clock(), self.monotonic())
+            self.version += 1
+
+    def sample(self, gh, pressure, flow, temperature):
+        shot = self._active.get(gh)
+        if shot is None:
+            return
+        with self._lock:
+            shot.add(self.monotonic() - shot.started, pressure, flow, temperature)
+            self.version += 1
+
+    def finish(self, gh, shot_id=None):
+        """End the shot on gh and return its summary, or None if none was running.
+
+        Takes constant time; add_plateau() adds the statistics that need
+        all of the shot's samples.
+        """
+        with self._lock:
+            shot = self._active.pop(gh, None)
+            if shot is None:
+                return None
+            summary = shot.summary(self.monotonic() - shot.started)
+            summary["id"] = shot_id
+            self._last[gh] = summary
+            self.version += 1
+        return summary
+
+    def add_plateau(self, gh, shot_id, samples):
+        """Add refine()'s plateau statistics to the last summary of gh, if it is still shot_id's.
+
+        samples are the shot's (offset, pressure, ...) tuples as
+        ShotLog.finish() returns them.
+        """
+        if not samples:
+            return
+        plateau = refine([s[0] for s in samples], [s[1] for s in samples])
+        with self._lock:
+            last = self._last.get(gh)
+            if last is None or last["id"] != shot_id:
+                return
+            # A new dict, since snapshots already handed out hold the old one
+            self._last[gh] = dict(last, **plateau)
+            self.version += 1
+
+    def snapshot(self):
+        """{"gh1": {"active": bool, "current": running stats or None, "last": summary or None}, ...}"""
+        with self._lock:
+            result = {}
+            for gh, last in self._last.items():
+                shot = self._active.get(gh)
+                result[f"gh{gh}"] = {
+                    "active": shot is not None,
+                    # So far, i.e. up to the latest sample
+                    "current": shot.summary(shot.last_t or 0.0) if shot is not None else None,
+                    "last": last,
+                }
+            return result
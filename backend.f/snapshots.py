@@ -0,0 +1,68 @@
+"""Versioned, pre-serialized JSON snapshots for the GET endpoints.
+
+A snapshot is rebuilt and re-serialized only when the key describing its
+inputs changes; otherwise the cached bytes and ETag are returned as-is.
+"""
+import json
+import threading
+import time
+
+# Part of every ETag so that version counters restarting at 1 after a
+# restart can never match a tag a client cached from the previous run
+_BOOT_ID = format(int(time.time() * 1000), 'x')
+
+
+def freeze(value):
+    """Turn nested dicts/lists into hashable, comparable tuples for use in a key."""
+    if isinstance(value, dict):
+        return tuple((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def etag_matches(if_none_match, etag):
+    """Return True if an If-None-Match header value matches etag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+class SnapshotCache:
+    """Named JSON snapshots, each with a version counter and ETag."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # name -> (key, version, etag, body)
+
+    def get(self, name, key, build):
+        """Return (etag, body) for name.
+
+        build() is only called, and its result only serialized, when key
+        differs from the key the current snapshot was built from.
+        """
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == key:
+            return entry[2], entry[3]
+        body = json.dumps(build()).encode()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == key:
+                return entry[2], entry[3]
+            version = entry[1] + 1 if entry is not None else 1
+            etag = f'"{_BOOT_ID}-{name}-{version}"'
+            self._entries[name] = (key, version, etag, body)
+        return etag, body
+
+    def version(self, name):
+        """Current version of a snapshot, 0 if it was never built."""
+        entry = self._entries.get(name)
+        return entry[1] if entry is not None else 0
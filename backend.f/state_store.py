@@ -0,0 +1,114 @@
+"""Copy-on-write snapshots of state shared between the UART and HTTP threads.
+
+Writers mutate the live object inside StateStore.writing(), one at a time;
+when the block ends a new Snapshot holding copies of the published
+attributes is swapped in with a single reference assignment.  Readers call
+snapshot() and get a consistent version without taking any lock, however
+many HTTP worker threads are reading at once.
+"""
+import contextlib
+import threading
+
+_MISSING = object()
+
+
+def _copy(value):
+    """Copy nested dicts and lists so the snapshot shares nothing with the live state."""
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+class Snapshot:
+    """One published version of the state, read through attributes.
+
+    Treat it as read-only: it is shared by every reader of this version.
+    """
+    __slots__ = ('_values', 'version')
+
+    def __init__(self, values, version):
+        object.__setattr__(self, '_values', values)
+        object.__setattr__(self, 'version', version)
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Snapshot is read-only")
+
+    def as_dict(self):
+        return _copy(self._values)
+
+
+class StateStore:
+    """Publishes snapshots of selected attributes of a live object.
+
+    source is the object writers mutate; fields names the attributes
+    readers need.  A field can also be a (name, getter) pair for state
+    that lives outside source, e.g. module globals.
+    """
+
+    def __init__(self, source, fields):
+        self._source = source
+        self._fields = tuple((f, None) if isinstance(f, str) else f for f in fields)
+        self._write_lock = threading.RLock()
+        self._depth = 0
+        self._listeners = []
+        self._snapshot = None
+        self.publish()
+
+    def snapshot(self):
+        """Latest published Snapshot; no locking, never torn."""
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def add_listener(self, callback):
+        """Call callback(snapshot) after every publish, still under the write lock."""
+        self._listeners.append(callback)
+
+    @contextlib.contextmanager
+    def writing(self):
+        """Serialize a block of writes and publish once the outermost block ends."""
+        with self._write_lock:
+            self._depth += 1
+            try:
+                yield self._source
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.publish()
+
+    def publish(self):
+        """Copy the published fields from source into a new Snapshot and swap it in.
+
+        Values equal to the current snapshot's are reused rather than copied,
+        and if nothing changed the current snapshot stays published.
+        """
+        with self._write_lock:
+            source = self._source
+            previous = self._snapshot._values if self._snapshot is not None else {}
+            values = {}
+            changed = self._snapshot is None
+            for name, getter in self._fields:
+                value = getter() if getter else getattr(source, name)
+                old = previous.get(name, _MISSING)
+                if old is not _MISSING and old == value:
+                    values[name] = old
+                else:
+                    values[name] = _copy(value)
+                    changed = True
+            if not changed:
+                return self._snapshot
+            version = self._snapshot.version + 1 if self._snapshot is not None else 1
+            snapshot = self._snapshot = Snapshot(values, version)
+            for callback in self._listeners:
+                callback(snapshot)
+            return snapshot
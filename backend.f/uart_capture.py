@@ -0,0 +1,200 @@
+"""Always-on capture of the raw bytes read from and written to the UART.
+
+Capture files are a small header followed by one record per chunk read
+from the port (RX) or frame written to it (TX), exactly as the bytes went
+over the wire:
+
+    header   b'UARTCAP1' | wall-clock start time (float64)
+    record   direction (RX=0, TX=1) | microseconds since the previous
+             record (uint32) | length (uint16) | the bytes
+
+All integers are little endian.  Timestamps come from the monotonic clock,
+so records are spaced correctly even if the wall clock is set meanwhile.
+A record costs 7 bytes on top of its data; at the usual status rates
+that is about 1 KB/s, so the default 4 files of 4 MB keep several hours.
+
+record() only appends to a buffer in memory; a background thread writes
+the buffer out every flush_interval seconds and starts a new file once
+the current one reaches max_file_bytes, deleting the oldest beyond
+max_files.  A chunk cut off by a crash at the end of a file is skipped
+when reading.
+"""
+import glob
+import logging
+import os
+import struct
+import threading
+import time
+
+logger = logging.getLogger('backend.uart')
+
+RX = 0
+TX = 1
+MAGIC = b'UARTCAP1'
+_HEADER = struct.Struct('<8sd')
+_RECORD = struct.Struct('<BIH')
+_MAX_DELTA_US = 0xFFFFFFFF
+_MAX_CHUNK = 0xFFFF
+# Write out early when this much is buffered
+_FLUSH_BYTES = 64 * 1024
+
+
+class UARTCapture:
+    """Rotating capture files of raw UART traffic in both directions."""
+
+    def __init__(self, directory, max_file_bytes=4 << 20, max_files=4, flush_interval=1.0,
+                 name='uart-capture'):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self.name = name
+        self._cond = threading.Condition()
+        self._pending = bytearray()
+        self._last_ns = time.monotonic_ns()
+        self._pending_base = self._last_ns  # Time the first delta in _pending counts from
+        self._file = None
+        self._file_bytes = 0
+        self._running = False
+        self._thread = None
+        self._failed = False
+        self.bytes_recorded = 0
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def record(self, direction, data):
+        """Append one chunk of bytes sent in direction (RX or TX); never touches the disk."""
+        now = time.monotonic_ns()
+        with self._cond:
+            if not self._running:
+                return
+            delta_us = (now - self._last_ns) // 1000
+            if delta_us > _MAX_DELTA_US:
+                # A gap of over an hour is shortened to 71 minutes
+                delta_us = _MAX_DELTA_US
+                self._last_ns = now
+            else:
+                self._last_ns += delta_us * 1000
+            pending = self._pending
+            if len(data) <= _MAX_CHUNK:
+                pending += _RECORD.pack(direction, delta_us, len(data))
+                pending += data
+            else:
+                for start in range(0, len(data), _MAX_CHUNK):
+                    chunk = data[start:start + _MAX_CHUNK]
+                    pending += _RECORD.pack(direction, delta_us, len(chunk))
+                    pending += chunk
+                    delta_us = 0
+            self.bytes_recorded += len(data)
+            if len(pending) >= _FLUSH_BYTES:
+                self._cond.notify()
+
+    def record_rx(self, data):
+        self.record(RX, data)
+
+    def record_tx(self, data):
+        self.record(TX, data)
+
+    def close(self, timeout=2.0):
+        """Write what is buffered and stop the writer thread."""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._running or len(self._pending) >= _FLUSH_BYTES,
+                                    self.flush_interval)
+                data, base = self._pending, self._pending_base
+                self._pending = bytearray()
+                self._pending_base = self._last_ns
+                running = self._running
+            if data:
+                self._write(data, base)
+            if not running:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _write(self, data, base_ns):
+        try:
+            if self._file is None or self._file_bytes + len(data) > self.max_file_bytes:
+                self._rotate(base_ns)
+            self._file.write(data)
+            self._file.flush()
+            self._file_bytes += len(data)
+            self._failed = False
+        except OSError as e:
+            if not self._failed:
+                logger.error("UART capture stopped writing to %s: %s", self.directory, e)
+                self._failed = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _rotate(self, base_ns):
+        """Start a new capture file whose first record counts from base_ns."""
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        files = capture_files(self.directory)
+        number = int(os.path.basename(files[-1])[5:-4]) + 1 if files else 1
+        path = os.path.join(self.directory, f'uart-{number:06d}.cap')
+        started = time.time() - (time.monotonic_ns() - base_ns) / 1e9
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, started))
+        self._file_bytes = _HEADER.size
+        for old in files[:max(0, len(files) + 1 - self.max_files)]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+        logger.debug("UART capture now writing %s", path)
+
+
+def open_capture(directory, **options):
+    """Started UARTCapture into directory, or None if directory is empty or 'off'."""
+    if not directory or directory.lower() == 'off':
+        return None
+    capture = UARTCapture(directory, **options)
+    capture.start()
+    return capture
+
+
+def capture_files(directory):
+    """Capture files in directory, oldest first."""
+    return sorted(glob.glob(os.path.join(directory, 'uart-[0-9]*.cap')))
+
+
+def read_capture(path):
+    """Yield (wall-clock time, direction, bytes) for each record of a capture file."""
+    with open(path, 'rb') as f:
+        blob = f.read()
+    if len(blob) < _HEADER.size:
+        return
+    magic, started = _HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a UART capture file")
+    pos = _HEADER.size
+    offset_us = 0
+    end = len(blob)
+    while pos + _RECORD.size <= end:
+        direction, delta_us, length = _RECORD.unpack_from(blob, pos)
+        pos += _RECORD.size
+        if pos + length > end:
+            break
+        offset_us += delta_us
+        yield started + offset_us / 1e6, direction, blob[pos:pos + length]
+        pos += length
@@ -1,25 +1,76 @@
+"""JSON status link to the display board.
+
+Messages are JSON objects, one per line.  Sent:
+
+    {"type": "status", "data": {...}}       the whole current_data; when the
+                                            link starts, after a write error
+                                            and every resync_interval seconds
+    {"type": "status_delta", "data": {...}, "removed": [[key, ...], ...]}
+                                            only the fields that changed since
+                                            the previous message, nested like
+                                            current_data; "removed" lists the
+                                            key paths that no longer exist and
+                                            is left out when there are none
+    {"type": "config_update", "data": {...}}
+
+A receiver applies a delta by merging data into its copy and deleting the
+removed paths; one that doesn't know status_delta yet is back in step at
+the next full status.  Received: sensor_data and config_update.
+"""
 import serial
 import threading
 import time
 import json
+import copy
 import logging
 from typing import Dict, Any
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-logger = logging.getLogger(__name__)
+from uart_io import LineReader
+
+logger = logging.getLogger('backend.uart')
+
+
+def _changed_fields(new, old):
+    """Fields of new (nested dicts included) that differ from old."""
+    changed = {}
+    for key, value in new.items():
+        previous = old.get(key) if isinstance(old, dict) else None
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = _changed_fields(value, previous)
+            if nested:
+                changed[key] = nested
+        elif value != previous or key not in old:
+            changed[key] = copy.deepcopy(value)
+    return changed
+
+
+def _removed_fields(new, old, path=()):
+    """Key paths of old (nested dicts included) that new no longer has."""
+    removed = []
+    for key, previous in old.items():
+        if key not in new:
+            removed.append([*path, key])
+        elif isinstance(previous, dict) and isinstance(new[key], dict):
+            removed.extend(_removed_fields(new[key], previous, (*path, key)))
+    return removed
+
 
 class UARTCommunicator:
-    def __init__(self, port='/dev/ttyS0', baudrate=115200):
+    """JSON status link; only changed fields are sent, with a full resync every resync_interval seconds."""
+
+    def __init__(self, port='/dev/ttyS0', baudrate=115200, min_interval=0.1, resync_interval=5.0):
         self.port = port
         self.baudrate = baudrate
         self.ser = None
         self.running = False
+        # Changes go out at most every min_interval seconds; the full state every resync_interval
+        self.min_interval = min_interval
+        self.resync_interval = resync_interval
         self.data_lock = threading.Lock()
+        # Signalled (with data_lock held) whenever current_data changes
+        self.data_changed = threading.Condition(self.data_lock)
+        self._last_sent = None
+        self._last_full = 0.0
         self.current_data = {
             "main_temperature": 110.0,
             "gh1": {
@@ -71,44 +122,68 @@ class UARTCommunicator:
             self.write_thread.daemon = True
             self.write_thread.start()
             
-            print(f"UART communication started on {self.port}")
+            logger.info("UART communication started on %s", self.port)
         except Exception as e:
-            print(f"Error starting UART communication: {e}")
+            logger.error("Error starting UART communication: %s", e)
             self.stop()
 
     def stop(self):
         """Stop the UART communication"""
         self.running = False
+        with self.data_changed:
+            self.data_changed.notify_all()
         if self.ser and self.ser.is_open:
             self.ser.close()
-        print("UART communication stopped")
+        logger.info("UART communication stopped")
 
     def _read_loop(self):
         """Continuously read data from UART"""
+        reader = LineReader(self.ser)
         while self.running:
             try:
-                if self.ser.in_waiting:
-                    data = self.ser.readline().decode('utf-8').strip()
+                # Blocks until data arrives, then handles every complete line received
+                for data in reader.read_lines(timeout=1.0):
                     self._process_received_data(data)
             except Exception as e:
-                print(f"Error reading from UART: {e}")
+                logger.error("Error reading from UART: %s", e)
                 time.sleep(1)
 
+    def _next_status(self):
+        """Wait for changes or the resync deadline; returns the message to send, or None when stopping."""
+        with self.data_changed:
+            while self.running:
+                now = time.monotonic()
+                if self._last_sent is None or now - self._last_full >= self.resync_interval:
+                    self._last_sent = copy.deepcopy(self.current_data)
+                    self._last_full = now
+                    return {"type": "status", "data": self._last_sent}
+                delta = _changed_fields(self.current_data, self._last_sent)
+                removed = _removed_fields(self.current_data, self._last_sent)
+                if delta or removed:
+                    self._last_sent = copy.deepcopy(self.current_data)
+                    message = {"type": "status_delta", "data": delta}
+                    if removed:
+                        message["removed"] = removed
+                    return message
+                self.data_changed.wait(self._last_full + self.resync_interval - now)
+        return None
+
     def _write_loop(self):
-        """Continuously write data to UART"""
+        """Send changed status fields as they change, and the full status every resync_interval"""
         while self.running:
             try:
-                # Prepare data to send
-                data_to_send = {
-                    "type": "status",
-                    "data": self.current_data
-                }
+                data_to_send = self._next_status()
+                if data_to_send is None:
+                    return
                 
                 # Send the data
                 self.ser.write((json.dumps(data_to_send) + '\n').encode())
-                time.sleep(0.1)  # Small delay between writes
+                time.sleep(self.min_interval)  # Changes arriving meanwhile go out together
             except Exception as e:
-                print(f"Error writing to UART: {e}")
+                logger.error("Error writing to UART: %s", e)
+                # Resend everything once the port works again
+                with self.data_changed:
+                    self._last_sent = None
                 time.sleep(1)
 
     def _process_received_data(self, data: str):
@@ -119,7 +194,7 @@ class UARTCommunicator:
             
             if data_type == 'sensor_data':
                 # Update current data with sensor readings
-                with self.data_lock:
+                with self.data_changed:
                     sensor_data = received_data.get('data', {})
                     if 'main_temperature' in sensor_data:
                         self.current_data['main_temperature'] = sensor_data['main_temperature']
@@ -127,6 +202,7 @@ class UARTCommunicator:
                         self.current_data['gh1'].update(sensor_data['gh1'])
                     if 'gh2' in sensor_data:
                         self.current_data['gh2'].update(sensor_data['gh2'])
+                    self.data_changed.notify_all()
                         
             elif data_type == 'config_update':
                 # Update configuration data
@@ -139,9 +215,9 @@ class UARTCommunicator:
                     self.config_data['gh2_config'].update(config_data['gh2_config'])
                     
         except json.JSONDecodeError:
-            print(f"Invalid JSON data received: {data}")
+            logger.warning("Invalid JSON data received: %s", data)
         except Exception as e:
-            print(f"Error processing received data: {e}")
+            logger.error("Error processing received data: %s", e)
 
     def get_current_data(self) -> Dict[str, Any]:
         """Get current sensor data"""
@@ -164,16 +240,18 @@ class UARTCommunicator:
                 }
                 self.ser.write((json.dumps(data_to_send) + '\n').encode())
             except Exception as e:
-                print(f"Error sending config update: {e}")
+                logger.error("Error sending config update: %s", e)
 
 # Example usage
 if __name__ == "__main__":
+    from log_setup import configure_logging
+    configure_logging(fmt='%(asctime)s - %(levelname)s - %(message)s')
     uart = UARTCommunicator()
     try:
         uart.start()
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        print("\nStopping UART communication...")
+        logger.info("Stopping UART communication...")
     finally:
         uart.stop() 
\ No newline at end of file
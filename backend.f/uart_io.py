@@ -0,0 +1,200 @@
+"""Buffered UART I/O helpers.
+
+Frames are handed to TransmitQueue.send() and written by a single writer
+thread that keeps the MCU's inter-frame spacing, so HTTP handlers never
+sleep on the serial port themselves.  LineReader blocks on the port until
+data arrives and returns every complete line received, so the read side
+neither polls nor falls behind during bursts.
+
+Under the asyncio runtime TransmitQueue.run_async() does the writing on
+the event loop and LineReader.read_lines(0) is called when the loop sees
+the port become readable.
+"""
+import collections
+import itertools
+import logging
+import select
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TransmitQueue:
+    """Frames waiting to go out over UART, written by one background thread.
+
+    send() only enqueues and returns immediately.  The writer leaves
+    frame_interval seconds between frames so the MCU has time to process
+    each one.  A frame whose flag is in coalesce_flags replaces a frame with
+    the same flag that is still waiting, keeping its place in the queue, so
+    superseded settings are never sent.
+    """
+
+    def __init__(self, write, frame_interval=0.1, coalesce_flags=(), name='uart-tx'):
+        self._write = write
+        self.frame_interval = frame_interval
+        self.coalesce_flags = frozenset(coalesce_flags)
+        self.name = name
+        self._cond = threading.Condition()
+        self._order = collections.deque()
+        self._frames = {}
+        self._seq = itertools.count()
+        self._writing = False
+        self._running = False
+        self._thread = None
+        self._wake = None
+        self.frames_sent = 0
+        self.frames_coalesced = 0
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Send what is still queued (within timeout), then stop the writer."""
+        self.flush(timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def send(self, message):
+        """Queue message for transmission without waiting for it to be written."""
+        self.send_many((message,))
+
+    def send_many(self, messages):
+        """Queue several frames at once; they go out back to back, paced as usual."""
+        with self._cond:
+            for message in messages:
+                flag = message.split(';', 1)[0]
+                key = flag if flag in self.coalesce_flags else next(self._seq)
+                if key in self._frames:
+                    self.frames_coalesced += 1
+                else:
+                    self._order.append(key)
+                self._frames[key] = message
+            self._cond.notify_all()
+            if self._wake is not None:
+                self._wake()
+
+    def pending(self):
+        """Number of frames waiting to be written."""
+        return len(self._order)
+
+    def flush(self, timeout=None):
+        """Wait until every queued frame has been written; returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._order and not self._writing, timeout)
+
+    def _write_one(self, message):
+        try:
+            self._write(message)
+            self.frames_sent += 1
+        except Exception:
+            logger.exception("UART write failed for frame %r", message)
+
+    def _written(self):
+        with self._cond:
+            self._writing = False
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._order or not self._running)
+                if not self._order:
+                    return
+                message = self._frames.pop(self._order.popleft())
+                self._writing = True
+            self._write_one(message)
+            # Inter-frame pacing; frames queued meanwhile can still be coalesced
+            time.sleep(self.frame_interval)
+            self._written()
+
+    async def run_async(self):
+        """Write queued frames from the running event loop until cancelled; use instead of start()."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        with self._cond:
+            self._wake = lambda: loop.call_soon_threadsafe(wake.set)
+        try:
+            while True:
+                wake.clear()
+                with self._cond:
+                    message = self._frames.pop(self._order.popleft()) if self._order else None
+                    self._writing = message is not None
+                if message is None:
+                    await wake.wait()
+                    continue
+                self._write_one(message)
+                try:
+                    await asyncio.sleep(self.frame_interval)
+                finally:
+                    self._written()
+        finally:
+            with self._cond:
+                self._wake = None
+
+
+class LineReader:
+    """Splits bytes arriving on a pyserial port into complete lines.
+
+    read_lines() sleeps in select() on the port's file descriptor until data
+    arrives, reads everything that is available in one call and returns all
+    complete lines; a trailing partial line is kept for the next call.
+    With a decoder (binary_frames.FrameDecoder) the bytes are handed to it
+    instead, and binary frames come back as (flag, values) among the lines.
+    capture, if given, is called with every chunk as it was read.
+    """
+
+    def __init__(self, port, max_line=4096, decoder=None, capture=None):
+        self.port = port
+        self.max_line = max_line
+        self.decoder = decoder
+        self.capture = capture
+        self._buffer = bytearray()
+        try:
+            self._fd = port.fileno()
+        except (AttributeError, OSError, NotImplementedError):
+            self._fd = None
+        self.bytes_read = 0
+        self.lines_read = 0
+
+    def read_lines(self, timeout=1.0):
+        """Wait up to timeout seconds for data and return the complete lines received."""
+        port = self.port
+        if self._fd is not None:
+            ready, _, _ = select.select([self._fd], [], [], timeout)
+            if not ready:
+                return []
+        # Without a file descriptor to wait on, the blocking read itself sleeps
+        # in the driver until data arrives or the port timeout expires
+        chunk = port.read(port.in_waiting or 1)
+        if not chunk:
+            return []
+        self.bytes_read += len(chunk)
+        if self.capture is not None:
+            self.capture(chunk)
+        if self.decoder is not None:
+            items = self.decoder.feed(chunk)
+            self.lines_read += len(items)
+            return items
+        buffer = self._buffer
+        buffer += chunk
+        if b'\n' not in chunk:
+            if len(buffer) > self.max_line:
+                logger.warning("Dropping %d bytes of UART input without a line break", len(buffer))
+                buffer.clear()
+            return []
+        *lines, rest = buffer.split(b'\n')
+        self._buffer = bytearray(rest)
+        decoded = [line.decode('utf-8', 'replace').strip() for line in lines]
+        decoded = [line for line in decoded if line]
+        self.lines_read += len(decoded)
+        return decoded
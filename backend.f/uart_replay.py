@@ -0,0 +1,263 @@
+"""Replay captured UART traffic through the backend's decode and state pipeline.
+
+Loads the backend script into this process and feeds every RX chunk of
+the capture files (see uart_capture), with the chunk boundaries the port
+delivered, to the backend's own FrameDecoder and process_uart_lines(), the
+same calls its UART reader makes.  Feeding is as fast as possible by
+default, or paced by the recorded timestamps with --speed (1 = real time,
+10 = ten times faster):
+
+    python uart_replay.py uart-capture/                  # every file in the directory
+    python uart_replay.py --speed 1 uart-capture/uart-000012.cap
+    python uart_replay.py --save-state after.json uart-capture/
+    python uart_replay.py --expect after.json uart-capture/   # exit status 1 if the state differs
+    python uart_replay.py --profile replay.prof uart-capture/
+    python uart_replay.py --dump uart-capture/uart-000012.cap # print the frames only
+
+The backend runs in a temporary directory with capture turned off, and its
+UART is a pty held by the replay, so frames it sends in response are
+counted instead of reaching any hardware.  Its clocks follow the capture's
+timestamps instead of the real time: shot durations and statistics,
+sensor history, error times and delayed actions (extraction timeouts,
+discharge resets) come out as they did in the field at any speed.
+"""
+import argparse
+import cProfile
+import importlib.machinery
+import importlib.util
+import json
+import os
+import pstats
+import select
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from binary_frames import FrameDecoder
+from uart_capture import RX, capture_files, read_capture
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BACKEND = os.path.join(HERE, '..', 'README.md')
+
+
+def capture_paths(paths):
+    """Capture files named in paths, with directories expanded to their files, oldest first."""
+    files = []
+    for path in paths:
+        files.extend(capture_files(path) if os.path.isdir(path) else [path])
+    return files
+
+
+def records(files):
+    for path in files:
+        yield from read_capture(path)
+
+
+def dump(files, out=sys.stdout):
+    """Print every frame in the capture, with its time and direction."""
+    decoders = {}
+    first = None
+    for stamp, direction, data in records(files):
+        first = stamp if first is None else first
+        decoder = decoders.setdefault(direction, FrameDecoder())
+        for item in decoder.feed(data):
+            frame = item if isinstance(item, str) else ';'.join(map(str, (item[0], *item[1])))
+            out.write(f"{stamp - first:12.6f} {'RX' if direction == RX else 'TX'} {frame}\n")
+
+
+class TransmitSink:
+    """A pty standing in for the UART port; counts the frames the backend writes to it."""
+
+    def __init__(self):
+        self.master, self.slave = os.openpty()
+        self.port_name = os.ttyname(self.slave)
+        self.decoder = FrameDecoder()
+        self.frames = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._drain, name='replay-tx', daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        while self._running:
+            try:
+                ready, _, _ = select.select([self.master], [], [], 0.2)
+                if ready:
+                    self.frames += len(self.decoder.feed(os.read(self.master, 4096)))
+            except OSError:
+                return
+
+    def close(self):
+        self._running = False
+        self._thread.join(1.0)
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class VirtualClock:
+    """Time as of the capture record being replayed, for both wall-clock and monotonic use."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+
+def use_clock(backend, clock):
+    """Point the backend's time-keeping at clock; the replay runs the scheduler's due calls itself."""
+    backend.scheduler.stop()
+    backend.scheduler.clock = clock.monotonic
+    backend.shot_log.clock = backend.shot_stats.clock = clock.time
+    backend.shot_log.monotonic = backend.shot_stats.monotonic = clock.monotonic
+    backend.sensor_history.clock = clock.time
+    backend.error_store.clock = clock.time
+
+
+def load_backend(script, uart_port):
+    """Import the backend script as a module; it opens nothing until it is used."""
+    os.environ['BACKEND_UART_PORT'] = uart_port
+    os.environ['BACKEND_UART_CAPTURE'] = 'off'
+    os.environ.setdefault('BACKEND_LOG_LEVEL', 'WARNING')
+    loader = importlib.machinery.SourceFileLoader('backend_replayed', os.path.abspath(script))
+    spec = importlib.util.spec_from_loader(loader.name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+def final_state(backend):
+    """The state a replay is judged by: /getdata, service data, lock status, shots and their statistics."""
+    backend.shot_log.flush(5.0)
+    snapshot = backend.config_state.snapshot()
+    state = {'getdata': backend.build_getdata(snapshot),
+             'service': snapshot.service_sensors,
+             'lock': snapshot.lock_state,
+             'shotstats': backend.shot_stats.snapshot(),
+             'shots': {str(shot.id): shot.as_dict() for shot in backend.shot_log.shots()}}
+    return json.loads(json.dumps(state))
+
+
+def replay(backend, files, speed=0.0, clock=None):
+    """Feed the RX chunks of files to backend; speed 0 means as fast as possible.
+
+    clock, a VirtualClock installed with use_clock(), is moved to each
+    record's timestamp before the record is fed.
+    """
+    decoder = backend.uart.decoder
+    process = backend.process_uart_lines
+    chunks = rx_bytes = frames = tx_records = 0
+    first = None
+    started = time.monotonic()
+    cpu_started = time.process_time()
+    for stamp, direction, data in records(files):
+        if clock is not None:
+            clock.now = max(clock.now, stamp)
+            backend.scheduler.run_due()
+        if direction != RX:
+            tx_records += 1
+            continue
+        if speed > 0:
+            first = stamp if first is None else first
+            delay = (stamp - first) / speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        chunks += 1
+        rx_bytes += len(data)
+        items = decoder.feed(data)
+        if items:
+            frames += len(items)
+            process(items)
+    elapsed = time.monotonic() - started
+    cpu = time.process_time() - cpu_started
+    return {
+        'files': len(files),
+        'rx_chunks': chunks,
+        'rx_bytes': rx_bytes,
+        'frames': frames,
+        'captured_tx_records': tx_records,
+        'seconds': round(elapsed, 3),
+        'frames_per_s': round(frames / elapsed, 1) if elapsed else None,
+        'cpu_us_per_frame': round(cpu / frames * 1e6, 2) if frames else None,
+        'crc_errors': decoder.crc_errors,
+        'dropped': decoder.dropped,
+    }
+
+
+def differences(expected, actual, prefix=''):
+    """Dotted paths of the values that differ between two JSON documents."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        paths = []
+        for key in sorted(set(expected) | set(actual)):
+            paths.extend(differences(expected.get(key), actual.get(key), f"{prefix}{key}."))
+        return paths
+    return [] if expected == actual else [f"{prefix[:-1]}: {expected!r} -> {actual!r}"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay UART captures through the backend")
+    parser.add_argument('paths', nargs='+', help="capture files or directories")
+    parser.add_argument('--backend', default=DEFAULT_BACKEND, help="backend script to load")
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help="1 = as recorded, N = N times faster, 0 = as fast as possible")
+    parser.add_argument('--dump', action='store_true', help="print the captured frames and exit")
+    parser.add_argument('--save-state', metavar='FILE', help="write the final state as JSON")
+    parser.add_argument('--expect', metavar='FILE', help="final state JSON to compare against")
+    parser.add_argument('--profile', metavar='FILE', help="write cProfile stats of the replay")
+    args = parser.parse_args()
+
+    files = capture_paths(args.paths)
+    if not files:
+        parser.error("no capture files found")
+    if args.dump:
+        dump(files)
+        return
+    # Resolve paths before leaving the current directory
+    files = [os.path.abspath(path) for path in files]
+    for option in ('save_state', 'expect', 'profile'):
+        if getattr(args, option):
+            setattr(args, option, os.path.abspath(getattr(args, option)))
+    previous_dir = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='uart-replay-')
+    os.chdir(workdir)
+    sink = TransmitSink()
+    try:
+        backend = load_backend(args.backend, sink.port_name)
+        clock = VirtualClock()
+        use_clock(backend, clock)
+        profiler = cProfile.Profile() if args.profile else None
+        if profiler is not None:
+            profiler.enable()
+        results = replay(backend, files, args.speed, clock)
+        if profiler is not None:
+            profiler.disable()
+        backend.uart.tx_queue.flush(5.0)
+        results['tx_frames_sent'] = sink.frames
+        state = final_state(backend)
+        backend.close_services()
+    finally:
+        sink.close()
+        os.chdir(previous_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+    if args.save_state:
+        with open(args.save_state, 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+    if args.expect:
+        with open(args.expect) as f:
+            mismatches = differences(json.load(f), state)
+        for line in mismatches:
+            print(f"DIFFERENT {line}")
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()